@@ -38,6 +38,63 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 }
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# Search configuration (seconds before the in-process search index is rebuilt)
+app.config["SEARCH_INDEX_TTL"] = int(os.environ.get("SEARCH_INDEX_TTL", "300"))
+app.config["SEARCH_PAGE_SIZE"] = int(os.environ.get("SEARCH_PAGE_SIZE", "24"))
+app.config["SEARCH_MAX_PAGE_SIZE"] = int(os.environ.get("SEARCH_MAX_PAGE_SIZE", "100"))
+
+# Seconds a cached category listing count is served before it is recounted
+app.config["CATEGORY_COUNT_TTL"] = int(os.environ.get("CATEGORY_COUNT_TTL", "300"))
+
+# Rendered page and fragment cache; backend is "memory" (per worker) or "redis" (shared)
+app.config["PAGE_CACHE_ENABLED"] = os.environ.get("PAGE_CACHE_ENABLED", "true").lower() in ["true", "on", "1"]
+app.config["PAGE_CACHE_BACKEND"] = os.environ.get("PAGE_CACHE_BACKEND", "memory")
+app.config["PAGE_CACHE_REDIS_URL"] = os.environ.get("PAGE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+app.config["PAGE_CACHE_SIZE"] = int(os.environ.get("PAGE_CACHE_SIZE", "512"))
+app.config["PAGE_CACHE_TTL"] = int(os.environ.get("PAGE_CACHE_TTL", "300"))
+
+# Read-through cache of product snapshots looked up by id
+app.config["PRODUCT_CACHE_SIZE"] = int(os.environ.get("PRODUCT_CACHE_SIZE", "2048"))
+app.config["PRODUCT_CACHE_TTL"] = int(os.environ.get("PRODUCT_CACHE_TTL", "300"))
+
+# Related products stored per product, and whether catalog writes and orders refresh them
+app.config["RECOMMENDATION_NEIGHBORS"] = int(os.environ.get("RECOMMENDATION_NEIGHBORS", "8"))
+app.config["RECOMMENDATIONS_AUTO_REFRESH"] = os.environ.get("RECOMMENDATIONS_AUTO_REFRESH", "true").lower() in ["true", "on", "1"]
+# Seconds completed orders are collected before their co-purchase refresh runs
+app.config["RECOMMENDATIONS_ORDER_DELAY"] = int(os.environ.get("RECOMMENDATIONS_ORDER_DELAY", "300"))
+# Memory budget for the dense score blocks of the vectorised similarity scorer
+app.config["SIMILARITY_MEMORY_MB"] = int(os.environ.get("SIMILARITY_MEMORY_MB", "64"))
+
+# HTTP caching of catalog pages: seconds the catalog validators are reused, and
+# max-age for shared caches on anonymous pages
+app.config["CATALOG_STATE_TTL"] = int(os.environ.get("CATALOG_STATE_TTL", "30"))
+app.config["CATALOG_MAX_AGE"] = int(os.environ.get("CATALOG_MAX_AGE", "60"))
+
+# Background threads per worker used to score chat sentiment
+app.config["CHATBOT_SENTIMENT_WORKERS"] = int(os.environ.get("CHATBOT_SENTIMENT_WORKERS", "2"))
+
+# Chatbot engine: OpenAI access and upstream concurrency limits. In-flight plus
+# queued chats stay below the gunicorn thread count so other pages keep threads.
+app.config["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY")
+app.config["OPENAI_BASE_URL"] = os.environ.get("OPENAI_BASE_URL")
+app.config["CHATBOT_MAX_CONCURRENCY"] = int(os.environ.get("CHATBOT_MAX_CONCURRENCY", "8"))
+app.config["CHATBOT_MAX_QUEUE"] = int(os.environ.get("CHATBOT_MAX_QUEUE", "16"))
+app.config["CHATBOT_TIMEOUT"] = float(os.environ.get("CHATBOT_TIMEOUT", "60"))
+
+# Token budgets for conversation history and for the whole chat prompt
+app.config["CHATBOT_HISTORY_TOKENS"] = int(os.environ.get("CHATBOT_HISTORY_TOKENS", "1500"))
+app.config["CHATBOT_PROMPT_TOKENS"] = int(os.environ.get("CHATBOT_PROMPT_TOKENS", "3000"))
+
+# Catalog matches attached to each chat prompt, and seconds before the retrieval index is rebuilt
+app.config["CHATBOT_RETRIEVAL_K"] = int(os.environ.get("CHATBOT_RETRIEVAL_K", "3"))
+app.config["CHATBOT_RETRIEVAL_TTL"] = int(os.environ.get("CHATBOT_RETRIEVAL_TTL", "300"))
+
+# Chatbot response cache for repeated questions
+app.config["CHATBOT_CACHE_SIZE"] = int(os.environ.get("CHATBOT_CACHE_SIZE", "512"))
+app.config["CHATBOT_CACHE_TTL"] = int(os.environ.get("CHATBOT_CACHE_TTL", "3600"))
+app.config["CHATBOT_CACHE_HISTORY_WINDOW"] = int(os.environ.get("CHATBOT_CACHE_HISTORY_WINDOW", "2"))
+app.config["CHATBOT_CACHE_SEMANTIC"] = os.environ.get("CHATBOT_CACHE_SEMANTIC", "false").lower() in ["true", "on", "1"]
+
 # Mail configuration
 app.config["MAIL_SERVER"] = os.environ.get("MAIL_SERVER", "smtp.gmail.com")
 app.config["MAIL_PORT"] = int(os.environ.get("MAIL_PORT", "587"))
@@ -60,5 +117,15 @@ login_manager.login_message_category = "info"
 app.config["PAYPAL_CLIENT_ID"] = os.environ.get("PAYPAL_CLIENT_ID", "ATeu5CLtb_KasnrA46vNPgaNrmcG1BpjEml_qYBThs3ImNdagp9NW0l0yF6KpCBUD9kBhAAafG3cWf2i")
 app.config["PAYPAL_CLIENT_SECRET"] = os.environ.get("PAYPAL_CLIENT_SECRET", "EF-FXUMAXfWMVtd3jWU-Pri9NPajE6Jjw3SLjcgMbfuvlmG3qROLenB8iBm6Md1IqqoPQ5BTdZUzoKzk")
 app.config["PAYPAL_SANDBOX"] = True
+app.config["PAYPAL_API_BASE"] = os.environ.get("PAYPAL_API_BASE", "https://api.sandbox.paypal.com")
+app.config["PAYPAL_POOL_SIZE"] = int(os.environ.get("PAYPAL_POOL_SIZE", "10"))
+app.config["PAYPAL_CONNECT_TIMEOUT"] = float(os.environ.get("PAYPAL_CONNECT_TIMEOUT", "3.05"))
+app.config["PAYPAL_READ_TIMEOUT"] = float(os.environ.get("PAYPAL_READ_TIMEOUT", "10"))
+app.config["PAYPAL_MAX_RETRIES"] = int(os.environ.get("PAYPAL_MAX_RETRIES", "2"))
+app.config["PAYPAL_BREAKER_THRESHOLD"] = int(os.environ.get("PAYPAL_BREAKER_THRESHOLD", "5"))
+app.config["PAYPAL_BREAKER_RESET"] = float(os.environ.get("PAYPAL_BREAKER_RESET", "30"))
+
+# Bearer token for the per-worker stats endpoints; unset keeps them disabled
+app.config["STATS_TOKEN"] = os.environ.get("STATS_TOKEN")
 
 # ✅ No `if __name__ == "__main__"` block here!
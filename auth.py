@@ -1,8 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, abort
 from flask_login import login_user, logout_user, login_required, current_user
 from flask_mail import Message
 from werkzeug.security import check_password_hash
 from urllib.parse import urlparse
+from functools import wraps
+import hmac
 import re
 
 from app import db, mail
@@ -10,6 +12,23 @@ from models import User
 
 bp = Blueprint('auth', __name__, url_prefix='/auth')
 
+def stats_token_required(view):
+    """Serve an operational stats endpoint only to callers sending STATS_TOKEN.
+
+    The token goes in an `Authorization: Bearer` header. With no STATS_TOKEN
+    configured the endpoint answers 404, so it is off by default.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = current_app.config.get('STATS_TOKEN')
+        if not token:
+            abort(404)
+        sent = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(sent.encode(), token.encode()):
+            abort(401)
+        return view(*args, **kwargs)
+    return wrapper
+
 def is_valid_email(email):
     """Validate email format"""
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
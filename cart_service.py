@@ -0,0 +1,110 @@
+from flask import session
+from sqlalchemy import Numeric, cast, func, insert, literal, select, update
+from sqlalchemy.orm import joinedload
+from app import db
+from models import CartItem, Order, OrderItem, Product
+
+# count is the number of cart lines, items the total quantity across lines
+EMPTY_SUMMARY = {'count': 0, 'items': 0, 'total': 0.0}
+
+def query_cart_summary(session_id):
+    """Line count, item count and total for a cart in one aggregate query"""
+    count, items, total = db.session.query(
+        func.count(CartItem.id),
+        func.coalesce(func.sum(CartItem.quantity), 0),
+        func.coalesce(func.sum(Product.price * CartItem.quantity), 0)
+    ).join(Product, CartItem.product_id == Product.id)\
+     .filter(CartItem.session_id == session_id).one()
+    return {'count': count, 'items': int(items), 'total': round(float(total), 2)}
+
+def load_cart_items(session_id):
+    """Cart items for a session with their products loaded in the same query"""
+    return CartItem.query.options(joinedload(CartItem.product, innerjoin=True))\
+                         .filter_by(session_id=session_id)\
+                         .order_by(CartItem.id).all()
+
+def refresh_cart_summary():
+    """Recompute the current session's cart summary and store it in the session.
+
+    Call after any write to the session's cart so page renders can read the
+    cached summary without touching the cart table.
+    """
+    if 'cart_session_id' not in session:
+        summary = dict(EMPTY_SUMMARY)
+    else:
+        summary = query_cart_summary(session['cart_session_id'])
+    session['cart_summary'] = summary
+    return summary
+
+def get_cart_summary():
+    """Cached cart summary for the current session"""
+    summary = session.get('cart_summary')
+    if summary is not None and 'items' in summary:
+        return summary
+    if 'cart_session_id' not in session:
+        return dict(EMPTY_SUMMARY)
+    # Sessions created before the current summary format was cached
+    return refresh_cart_summary()
+
+def create_order_from_cart(session_id, order_number):
+    """Insert a pending order and all of its items from the cart in one transaction.
+
+    The order row is inserted with RETURNING, then every item is copied with a
+    single INSERT ... SELECT that snapshots the product price while reading the
+    cart, so the write cost does not grow with a Python loop over cart lines.
+    The order total is summed from those copied items in the same transaction,
+    so the amount charged always matches the stored lines.
+    Returns (order id, total), or None when the cart is empty.
+    """
+    try:
+        order_id = db.session.execute(
+            insert(Order).values(
+                order_number=order_number,
+                session_id=session_id,
+                total_amount=0,
+                status='pending'
+            ).returning(Order.id)
+        ).scalar_one()
+        
+        cart_lines = select(
+            literal(order_id), CartItem.product_id, CartItem.quantity, Product.price
+        ).join(Product, CartItem.product_id == Product.id)\
+         .where(CartItem.session_id == session_id)
+        copied = db.session.execute(
+            insert(OrderItem).from_select(['order_id', 'product_id', 'quantity', 'price'], cart_lines)
+        ).rowcount
+        if not copied:
+            db.session.rollback()
+            return None
+        
+        total = db.session.execute(_set_total_from_items(order_id)).scalar_one()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return order_id, round(float(total), 2)
+
+def _set_total_from_items(order_id):
+    """UPDATE setting an order's total to the sum of its stored lines"""
+    line_total = select(func.sum(OrderItem.price * OrderItem.quantity))\
+        .where(OrderItem.order_id == order_id).scalar_subquery()
+    # PostgreSQL only rounds to a number of places for numeric, not double precision
+    return update(Order).where(Order.id == order_id)\
+        .values(total_amount=func.round(cast(line_total, Numeric), 2))\
+        .returning(Order.total_amount)
+
+def _set_order(order_id, **values):
+    try:
+        db.session.execute(update(Order).where(Order.id == order_id).values(**values))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+def attach_paypal_order(order_id, paypal_order_id):
+    """Record the PayPal order created for a stored order"""
+    _set_order(order_id, paypal_order_id=paypal_order_id)
+
+def mark_order_failed(order_id):
+    """Flag a stored order whose PayPal order could not be created"""
+    _set_order(order_id, status='failed')
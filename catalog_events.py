@@ -0,0 +1,51 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import Product
+import logging
+
+# Callbacks run after a commit that touched Product rows.
+# Each receives (upserted, deleted_ids) where upserted is a list of column snapshots.
+_listeners = []
+
+def on_products_changed(callback):
+    """Register a callback for committed Product inserts, updates and deletes"""
+    _listeners.append(callback)
+    return callback
+
+def _snapshot(product):
+    """Copy the column values of a Product so they survive session expiry"""
+    return {column.key: getattr(product, column.key) for column in Product.__table__.columns}
+
+def notify_products_changed(upserted=(), deleted_ids=()):
+    """Dispatch a change set to every registered listener"""
+    upserted = list(upserted)
+    deleted_ids = list(deleted_ids)
+    if not upserted and not deleted_ids:
+        return
+    for callback in _listeners:
+        try:
+            callback(upserted, deleted_ids)
+        except Exception as e:
+            logging.error(f"Catalog listener {callback.__name__} failed: {e}")
+
+@event.listens_for(Session, 'after_flush')
+def _collect_product_changes(session, flush_context):
+    pending = session.info.setdefault('product_changes', {'upserted': {}, 'deleted': set()})
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Product) and obj.id is not None:
+            pending['upserted'][obj.id] = _snapshot(obj)
+            pending['deleted'].discard(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            pending['upserted'].pop(obj.id, None)
+            pending['deleted'].add(obj.id)
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_product_changes(session):
+    pending = session.info.pop('product_changes', None)
+    if pending:
+        notify_products_changed(pending['upserted'].values(), pending['deleted'])
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_product_changes(session):
+    session.info.pop('product_changes', None)
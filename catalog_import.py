@@ -0,0 +1,261 @@
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import bindparam, insert, or_, select, update
+from app import app, db
+from models import Product, CategoryType, product_sku
+from tags import sync_product_tags
+from catalog_events import notify_products_changed
+from recommendations import schedule_rebuild
+import click
+import csv
+import json
+import logging
+import math
+import os
+import time
+
+# Columns an import row may set; sku is derived from category and title when absent
+IMPORT_FIELDS = ['sku', 'title', 'description', 'price', 'category', 'image_url', 'release_date',
+                 'rating', 'genre', 'platform', 'director', 'developer']
+_UPDATABLE = [field for field in IMPORT_FIELDS if field != 'sku']
+
+class CatalogRowError(ValueError):
+    """Raised for an import row that cannot be loaded"""
+
+def _text(raw, field, required=False):
+    value = raw.get(field)
+    value = value.strip() if isinstance(value, str) else value
+    if value in (None, ''):
+        if required:
+            raise CatalogRowError(f"{field} is required")
+        return None
+    value = str(value)
+    limit = Product.__table__.c[field].type.length
+    if limit and len(value) > limit:
+        raise CatalogRowError(f"{field} is longer than {limit} characters")
+    return value
+
+def _number(raw, field, required=False, low=None, high=None):
+    value = raw.get(field)
+    if value in (None, ''):
+        if required:
+            raise CatalogRowError(f"{field} is required")
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise CatalogRowError(f"{field} must be a number")
+    # nan passes every range check below, since all comparisons with it are false
+    if not math.isfinite(value):
+        raise CatalogRowError(f"{field} must be a finite number")
+    if (low is not None and value < low) or (high is not None and value > high):
+        raise CatalogRowError(f"{field} must be between {low} and {high}")
+    return value
+
+def validate_row(raw):
+    """Turn one raw CSV/JSON record into column values, or raise CatalogRowError"""
+    category = raw.get('category')
+    if not isinstance(category, CategoryType):
+        try:
+            category = CategoryType(str(category or '').strip().lower())
+        except ValueError:
+            raise CatalogRowError(f"category must be one of {', '.join(c.value for c in CategoryType)}")
+    release_date = raw.get('release_date')
+    if release_date and not isinstance(release_date, date):
+        try:
+            release_date = date.fromisoformat(str(release_date).strip())
+        except ValueError:
+            raise CatalogRowError("release_date must be an ISO date (YYYY-MM-DD)")
+    row = {
+        'title': _text(raw, 'title', required=True),
+        'description': _text(raw, 'description', required=True),
+        'price': _number(raw, 'price', required=True, low=0),
+        'category': category,
+        'image_url': _text(raw, 'image_url'),
+        'release_date': release_date or None,
+        'rating': _number(raw, 'rating', low=0, high=10),
+        'genre': _text(raw, 'genre'),
+        'platform': _text(raw, 'platform'),
+        'director': _text(raw, 'director'),
+        'developer': _text(raw, 'developer'),
+    }
+    row['sku'] = _text(raw, 'sku') or product_sku(category, row['title'])
+    return row
+
+def read_records(path, file_format=None):
+    """Yield raw records from a CSV or JSON Lines file one at a time"""
+    file_format = file_format or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    with open(path, newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                # Reported as a row error by the caller
+                yield e
+
+def _upsert_statement(dialect):
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    table = Product.__table__
+    statement = dialect_insert(table)
+    # Rows whose values are unchanged are left alone, so re-running an import
+    # does not touch updated_at or invalidate HTTP validators
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.sku],
+        set_={**{field: statement.excluded[field] for field in _UPDATABLE}, 'updated_at': statement.excluded.updated_at},
+        where=or_(*(table.c[field].is_distinct_from(statement.excluded[field]) for field in _UPDATABLE))
+    ).returning(*table.c)
+
+def _upsert_executemany(connection, rows):
+    """Portable path: look up existing skus, then one executemany UPDATE and one INSERT"""
+    table = Product.__table__
+    existing = dict(connection.execute(
+        select(table.c.sku, table.c.id).where(table.c.sku.in_([row['sku'] for row in rows]))
+    ).all())
+    updates = [{**row, 'b_sku': row['sku']} for row in rows if row['sku'] in existing]
+    inserts = [row for row in rows if row['sku'] not in existing]
+    if updates:
+        connection.execute(
+            update(table).where(table.c.sku == bindparam('b_sku'))
+            .values({field: bindparam(field) for field in [*_UPDATABLE, 'updated_at']}),
+            updates
+        )
+    if inserts:
+        connection.execute(insert(table), inserts)
+    return connection.execute(select(table).where(table.c.sku.in_([row['sku'] for row in rows]))).all()
+
+def upsert_products(connection, rows):
+    """Insert or update a batch of validated rows by sku and refresh their tags.
+
+    Returns column snapshots of the rows inserted or changed.
+    """
+    now = datetime.utcnow()
+    # Later rows win when a batch repeats a sku
+    rows = list({row['sku']: {**row, 'created_at': now, 'updated_at': now} for row in rows}.values())
+    statement = _upsert_statement(connection.dialect.name)
+    if statement is not None:
+        changed = connection.execute(statement, rows).all()
+    else:
+        changed = _upsert_executemany(connection, rows)
+    changed = [dict(row._mapping) for row in changed]
+    sync_product_tags(connection, [(row['id'], row['genre'], row['platform']) for row in changed])
+    return changed
+
+class _Checkpoint:
+    """Progress file letting an interrupted import skip records it already committed"""
+
+    def __init__(self, path, source):
+        self.path = path
+        stat = os.stat(source)
+        self.fingerprint = {'source': os.path.abspath(source), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        # A changed input file starts over; upserts make that safe anyway
+        return saved.get('records', 0) if saved.get('fingerprint') == self.fingerprint else 0
+
+    def save(self, records):
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'fingerprint': self.fingerprint, 'records': records}, f)
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def import_records(records, batch_size=1000, skip=0, max_errors=100, on_batch=None):
+    """Validate and upsert records in batches of `batch_size`, one transaction each.
+
+    The first `skip` records are read but not loaded. `on_batch(stats)` runs
+    after each commit. Memory stays flat: only one batch is held at a time.
+    Related products are rebuilt once, after the last batch, rather than
+    refreshed batch by batch.
+    """
+    stats = {'records': 0, 'changed': 0, 'errors': 0, 'started': time.monotonic()}
+    batch = []
+
+    def flush():
+        with db.engine.begin() as connection:
+            changed = upsert_products(connection, batch)
+        batch.clear()
+        stats['changed'] += len(changed)
+        # Core statements bypass the session events, so announce the batch here
+        notify_products_changed(changed)
+        if on_batch:
+            on_batch(stats)
+
+    for number, record in enumerate(records, start=1):
+        stats['records'] = number
+        if number <= skip:
+            continue
+        try:
+            if isinstance(record, Exception):
+                raise CatalogRowError(f"invalid JSON: {record}")
+            batch.append(validate_row(record))
+        except CatalogRowError as e:
+            stats['errors'] += 1
+            logging.warning(f"Skipping catalog record {number}: {e}")
+            if stats['errors'] > max_errors:
+                raise click.ClickException(f"Stopped after {stats['errors']} invalid records")
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    # A resumed run may follow batches changed by the interrupted one
+    if (stats['changed'] or skip) and current_app.config['RECOMMENDATIONS_AUTO_REFRESH']:
+        schedule_rebuild()
+    return stats
+
+def import_catalog(path, file_format=None, batch_size=1000, resume=True, max_errors=100, progress=None):
+    """Stream a CSV or JSONL catalog file into the product table.
+
+    Progress is checkpointed next to the input after every batch, so a rerun
+    after an interruption continues from the last committed batch.
+    """
+    checkpoint = _Checkpoint(path + '.progress', path)
+    skip = checkpoint.load() if resume else 0
+
+    def on_batch(stats):
+        checkpoint.save(stats['records'])
+        if progress:
+            progress(stats)
+
+    stats = import_records(read_records(path, file_format), batch_size, skip, max_errors, on_batch)
+    checkpoint.clear()
+    stats['skipped'] = skip
+    return stats
+
+@app.cli.command('import-catalog')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--max-errors', default=100, show_default=True, help='Invalid records tolerated before stopping')
+@click.option('--restart', is_flag=True, help='Ignore saved progress and start from the first record')
+def import_catalog_command(path, file_format, batch_size, max_errors, restart):
+    """Upsert products from a CSV or JSON Lines file"""
+    def progress(stats):
+        elapsed = time.monotonic() - stats['started']
+        print(f"{stats['records']} records read, {stats['changed']} changed, {stats['errors']} invalid "
+              f"({stats['records'] / elapsed:.0f} records/s)")
+
+    stats = import_catalog(path, file_format, batch_size, not restart, max_errors, progress)
+    if stats['skipped']:
+        print(f"Resumed after {stats['skipped']} records already imported")
+    print(f"Done: {stats['records']} records, {stats['changed']} products inserted or changed, "
+          f"{stats['errors']} invalid")
@@ -0,0 +1,267 @@
+from collections import Counter
+from flask import current_app
+from openai import AsyncOpenAI
+import asyncio
+import hashlib
+import json
+import queue
+import threading
+
+class EngineSaturatedError(Exception):
+    """Raised when too many chat completions are already queued or in flight"""
+
+_STREAM_DONE = object()
+
+class ChatEngine:
+    """Runs chat completions on an asyncio loop shared by all request threads.
+
+    A background thread owns the event loop and one AsyncOpenAI client.
+    Request threads hand completions to it and wait for the result.
+    `max_concurrency` bounds the upstream calls in flight. Up to
+    `max_queue` more callers may wait for a slot; past that, callers get
+    EngineSaturatedError immediately so the route can answer 429 instead of
+    tying up a worker. Identical requests that overlap in time share one
+    upstream call, streamed or not.
+
+    The limits are per process. Run gunicorn with threaded workers
+    (`-k gthread`) and more threads than `max_concurrency + max_queue`, so
+    chat is rejected before it can take every thread a worker has.
+    """
+
+    def __init__(self, client, max_concurrency=8, max_queue=32, timeout=60):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight = {}  # request key -> asyncio.Task, only touched on the loop thread
+        self._streams = {}   # request key -> _Broadcast, only touched on the loop thread
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.counters = Counter()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='chat-engine', daemon=True)
+        self._thread.start()
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _admit(self):
+        with self._lock:
+            if self._pending >= self.max_concurrency + self.max_queue:
+                self.counters['rejected'] += 1
+                raise EngineSaturatedError("Chat engine is saturated")
+            self._pending += 1
+            self.counters['admitted'] += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['pending'] = self._pending
+        stats['max_concurrency'] = self.max_concurrency
+        stats['max_queue'] = self.max_queue
+        return stats
+
+    async def _create(self, params):
+        async with self._semaphore:
+            return await self.client.chat.completions.create(**params)
+
+    async def _coalesced(self, key, params):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._create(params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self._count('coalesced')
+        # Shield so one caller timing out does not cancel the call for the others
+        return await asyncio.shield(task)
+
+    def complete(self, **params):
+        """Run a chat completion and return the response object"""
+        self._admit()
+        try:
+            key = _request_key(params)
+            future = asyncio.run_coroutine_threadsafe(self._coalesced(key, params), self._loop)
+            return future.result(timeout=self.timeout)
+        finally:
+            self._release()
+
+    async def _pump(self, key, broadcast, params):
+        try:
+            async with self._semaphore:
+                stream = await self.client.chat.completions.create(stream=True, **params)
+                async for chunk in stream:
+                    broadcast.publish(chunk)
+            broadcast.finish(_STREAM_DONE)
+        except asyncio.CancelledError:
+            broadcast.finish(_STREAM_DONE)
+            raise
+        except Exception as e:
+            broadcast.finish(e)
+        finally:
+            self._streams.pop(key, None)
+
+    async def _subscribe(self, key, params, chunks):
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._pump(key, broadcast, params))
+        else:
+            self._count('coalesced')
+        broadcast.subscribe(chunks)
+        return broadcast
+
+    def _unsubscribe(self, broadcast, chunks):
+        # Stop the upstream call once every client reading it has gone away
+        if broadcast.unsubscribe(chunks) and not broadcast.finished:
+            broadcast.task.cancel()
+
+    def stream(self, **params):
+        """Start a streaming chat completion and return an iterator of chunks.
+
+        Admission happens here, before any chunk is read, so callers can turn
+        EngineSaturatedError into a 429 before sending response headers.
+        Joining an identical stream already in flight replays the chunks it
+        has sent so far, then follows it live.
+        """
+        self._admit()
+        chunks = queue.Queue()
+        try:
+            broadcast = asyncio.run_coroutine_threadsafe(
+                self._subscribe(_request_key(params), params, chunks), self._loop
+            ).result(timeout=self.timeout)
+        except BaseException:
+            self._release()
+            raise
+
+        def close():
+            self._loop.call_soon_threadsafe(self._unsubscribe, broadcast, chunks)
+            self._release()
+        return _ChunkStream(chunks, close, self.timeout)
+
+    def embed(self, **params):
+        """Create embeddings under the same concurrency limits"""
+        self._admit()
+        try:
+            async def create():
+                async with self._semaphore:
+                    return await self.client.embeddings.create(**params)
+            return asyncio.run_coroutine_threadsafe(create(), self._loop).result(timeout=self.timeout)
+        finally:
+            self._release()
+
+def _request_key(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+class _Broadcast:
+    """One upstream stream fanned out to every caller that asked for it.
+
+    Chunks are kept so a caller joining late first replays what it missed.
+    Only used on the engine's loop thread.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.subscribers = []
+        self.finished = False
+        self.outcome = None
+        self.task = None
+
+    def subscribe(self, subscriber):
+        for chunk in self.chunks:
+            subscriber.put(chunk)
+        if self.finished:
+            subscriber.put(self.outcome)
+        else:
+            self.subscribers.append(subscriber)
+
+    def unsubscribe(self, subscriber):
+        """Drop a subscriber; True when none are left"""
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+        return not self.subscribers
+
+    def publish(self, chunk):
+        self.chunks.append(chunk)
+        for subscriber in self.subscribers:
+            subscriber.put(chunk)
+
+    def finish(self, outcome):
+        self.finished = True
+        self.outcome = outcome
+        for subscriber in self.subscribers:
+            subscriber.put(outcome)
+        self.subscribers = []
+
+class _ChunkStream:
+    """Iterator over streamed chunks that frees its engine slot exactly once.
+
+    The slot is released when the stream ends, fails, is closed, or is
+    garbage collected without ever being read (a client that disconnects
+    before the first chunk).
+    """
+
+    def __init__(self, chunks, on_close, timeout):
+        self._chunks = chunks
+        self._on_close = on_close
+        self._timeout = timeout
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._closed:
+            raise StopIteration
+        try:
+            item = self._chunks.get(timeout=self._timeout)
+        except queue.Empty:
+            self.close()
+            raise TimeoutError("Timed out waiting for the completion stream")
+        if item is _STREAM_DONE:
+            self.close()
+            raise StopIteration
+        if isinstance(item, Exception):
+            self.close()
+            raise item
+        return item
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            # Leaves the shared stream; the upstream call stops when the last reader leaves
+            self._on_close()
+
+    def __del__(self):
+        self.close()
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_chat_engine():
+    """Process-wide chat engine built from the app configuration"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                config = current_app.config
+                client = AsyncOpenAI(
+                    api_key=config['OPENAI_API_KEY'],
+                    base_url=config['OPENAI_BASE_URL'],
+                    timeout=config['CHATBOT_TIMEOUT'],
+                    max_retries=1
+                )
+                _engine = ChatEngine(
+                    client,
+                    max_concurrency=config['CHATBOT_MAX_CONCURRENCY'],
+                    max_queue=config['CHATBOT_MAX_QUEUE'],
+                    timeout=config['CHATBOT_TIMEOUT']
+                )
+    return _engine
@@ -1,12 +1,17 @@
 import json
-import os
-from openai import OpenAI
 from flask import current_app
+from chat_engine import get_chat_engine, EngineSaturatedError
+from response_cache import get_response_cache
+from prompt_builder import PromptBuilder
+from retrieval import relevant_product_facts
 
 # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
 # do not change this unless explicitly requested by the user
-OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+
+def embed_text(text):
+    """Embedding vector for a short text, used for paraphrase cache lookups"""
+    response = get_chat_engine().embed(model="text-embedding-3-small", input=text)
+    return response.data[0].embedding
 
 class CustomerSupportChatbot:
     def __init__(self):
@@ -31,31 +36,63 @@ class CustomerSupportChatbot:
         If you cannot answer a specific question, politely direct the customer to contact human support.
         """
     
+        self.prompt_builder = PromptBuilder(self.system_prompt)
+    
+    def build_messages(self, user_message, conversation_history=None):
+        """Assemble the chat completion messages for a user turn within the prompt budget"""
+        messages, prompt_tokens = self.prompt_builder.build(
+            user_message,
+            conversation_history,
+            token_budget=current_app.config['CHATBOT_PROMPT_TOKENS'],
+            facts=relevant_product_facts(user_message)
+        )
+        current_app.logger.debug(f"Chat prompt: {len(messages)} messages, ~{prompt_tokens} tokens")
+        return messages
+    
+    def log_usage(self, logger, usage, streamed=False):
+        """Log the token usage reported by the API for one completion"""
+        if usage is None:
+            return
+        logger.info(
+            f"Chat completion usage: prompt={usage.prompt_tokens} "
+            f"completion={usage.completion_tokens} streamed={streamed}"
+        )
+    
     def get_response(self, user_message, conversation_history=None):
         """Get a response from the chatbot for customer support"""
         try:
-            messages = [{"role": "system", "content": self.system_prompt}]
+            cache = get_response_cache()
+            cached, cache_key = cache.lookup(user_message, conversation_history)
+            if cached is not None:
+                return {
+                    "success": True,
+                    "response": cached,
+                    "error": None,
+                    "cached": True
+                }
             
-            # Add conversation history if provided
-            if conversation_history:
-                messages.extend(conversation_history)
+            messages = self.build_messages(user_message, conversation_history)
             
-            # Add the current user message
-            messages.append({"role": "user", "content": user_message})
-            
-            response = openai_client.chat.completions.create(
+            response = get_chat_engine().complete(
                 model="gpt-4o",
                 messages=messages,
                 max_tokens=500,
                 temperature=0.7
             )
             
+            self.log_usage(current_app.logger, getattr(response, 'usage', None))
+            content = response.choices[0].message.content
+            cache.store(cache_key, content)
+            
             return {
                 "success": True,
-                "response": response.choices[0].message.content,
-                "error": None
+                "response": content,
+                "error": None,
+                "cached": False
             }
             
+        except EngineSaturatedError:
+            raise
         except Exception as e:
             current_app.logger.error(f"Chatbot error: {str(e)}")
             return {
@@ -64,10 +101,43 @@ class CustomerSupportChatbot:
                 "error": str(e)
             }
     
+    def stream_response(self, user_message, conversation_history=None):
+        """Start streaming a response and return an iterator of text chunks.
+
+        Raises EngineSaturatedError before anything is streamed when the chat
+        engine has no capacity left.
+        """
+        cache = get_response_cache()
+        cached, cache_key = cache.lookup(user_message, conversation_history)
+        if cached is not None:
+            return iter([cached])
+        
+        chunks = get_chat_engine().stream(
+            model="gpt-4o",
+            messages=self.build_messages(user_message, conversation_history),
+            max_tokens=500,
+            temperature=0.7,
+            stream_options={"include_usage": True}
+        )
+        return self._relay_stream(chunks, cache, cache_key, current_app.logger)
+    
+    def _relay_stream(self, chunks, cache, cache_key, logger):
+        parts = []
+        try:
+            for chunk in chunks:
+                # With include_usage the final chunk carries usage and no choices
+                self.log_usage(logger, getattr(chunk, 'usage', None), streamed=True)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        finally:
+            chunks.close()
+        cache.store(cache_key, ''.join(parts))
+    
     def analyze_sentiment(self, message):
-        """Analyze customer message sentiment for support prioritization"""
+        """Analyze customer message sentiment for support prioritization; None if the LLM call fails"""
         try:
-            response = openai_client.chat.completions.create(
+            response = get_chat_engine().complete(
                 model="gpt-4o",
                 messages=[
                     {
@@ -89,13 +159,9 @@ class CustomerSupportChatbot:
             }
             
         except Exception as e:
+            # No made-up verdict: the caller keeps its own estimate instead
             current_app.logger.error(f"Sentiment analysis error: {str(e)}")
-            return {
-                "rating": 3,
-                "confidence": 0.5,
-                "urgent": False,
-                "emotion": "neutral"
-            }
+            return None
 
 # Global chatbot instance
 chatbot = CustomerSupportChatbot()
\ No newline at end of file
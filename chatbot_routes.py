@@ -1,6 +1,12 @@
-from flask import Blueprint, request, jsonify, render_template, session
+from flask import Blueprint, request, jsonify, render_template, session, current_app, Response, stream_with_context
 from chatbot import chatbot
+from chat_engine import get_chat_engine, EngineSaturatedError
+from sentiment import submit_sentiment, get_conversation_sentiment
+from response_cache import get_response_cache
+from conversation_store import append_exchange, load_history, recent_messages
+from auth import stats_token_required
 import json
+import uuid
 
 chatbot_bp = Blueprint('chatbot', __name__, url_prefix='/chatbot')
 
@@ -9,6 +15,36 @@ def chatbot_page():
     """Render the chatbot interface page"""
     return render_template('chatbot.html')
 
+def get_conversation_id():
+    """Id of the current chat conversation, created on first use"""
+    if 'chat_conversation_id' not in session:
+        session['chat_conversation_id'] = uuid.uuid4().hex
+    return session['chat_conversation_id']
+
+def get_chat_history():
+    """Recent history of the current conversation within the prompt token budget"""
+    if 'chat_conversation_id' not in session:
+        return []
+    return load_history(session['chat_conversation_id'], current_app.config['CHATBOT_HISTORY_TOKENS'])
+
+@chatbot_bp.before_app_request
+def drop_cookie_chat_history():
+    """Remove chat history left in the session cookie by older versions"""
+    if 'chat_history' in session:
+        session.pop('chat_history')
+
+def _saturated_response():
+    return jsonify({
+        'success': False,
+        'error': 'Too many requests',
+        'response': 'Our support assistant is busy right now. Please try again in a few seconds.'
+    }), 429, {'Retry-After': '5'}
+
+def _sse(data, event=None):
+    """Format one Server-Sent Events frame"""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
 @chatbot_bp.route('/chat', methods=['POST'])
 def chat():
     """Handle chat messages from the user"""
@@ -22,25 +58,22 @@ def chat():
                 'error': 'Message cannot be empty'
             }), 400
         
-        # Get conversation history from session
-        conversation_history = session.get('chat_history', [])
+        # Get conversation history from the server-side store
+        conversation_history = get_chat_history()
         
         # Get response from chatbot
-        result = chatbot.get_response(user_message, conversation_history)
+        try:
+            result = chatbot.get_response(user_message, conversation_history)
+        except EngineSaturatedError:
+            return _saturated_response()
         
         if result['success']:
             # Update conversation history
-            conversation_history.append({"role": "user", "content": user_message})
-            conversation_history.append({"role": "assistant", "content": result['response']})
+            append_exchange(get_conversation_id(), user_message, result['response'])
             
-            # Keep only last 10 messages to avoid session bloat
-            if len(conversation_history) > 10:
-                conversation_history = conversation_history[-10:]
-            
-            session['chat_history'] = conversation_history
-            
-            # Analyze sentiment for support prioritization
-            sentiment = chatbot.analyze_sentiment(user_message)
+            # Sentiment for support prioritization is scored in the background;
+            # the immediate heuristic estimate is returned with the reply
+            sentiment = submit_sentiment(chatbot, get_conversation_id(), user_message)
             
             return jsonify({
                 'success': True,
@@ -61,14 +94,89 @@ def chat():
             'response': 'Sorry, I encountered an error. Please try again.'
         }), 500
 
+@chatbot_bp.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream the chatbot reply to a message as Server-Sent Events"""
+    data = request.get_json(silent=True) or {}
+    user_message = data.get('message', '').strip()
+    
+    if not user_message:
+        return jsonify({
+            'success': False,
+            'error': 'Message cannot be empty'
+        }), 400
+    
+    conversation_history = get_chat_history()
+    # Created before streaming so the session cookie carries it
+    conversation_id = get_conversation_id()
+    
+    try:
+        chunks = chatbot.stream_response(user_message, conversation_history)
+    except EngineSaturatedError:
+        return _saturated_response()
+    except Exception as e:
+        current_app.logger.error(f"Chatbot stream error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'response': "I'm sorry, I'm having trouble connecting right now. Please try again later or contact our support team."
+        }), 500
+    
+    submit_sentiment(chatbot, conversation_id, user_message)
+    
+    def generate():
+        parts = []
+        try:
+            for delta in chunks:
+                parts.append(delta)
+                yield _sse({'delta': delta})
+        except Exception as e:
+            current_app.logger.error(f"Chatbot stream error: {str(e)}")
+            yield _sse({
+                'error': str(e),
+                'response': "I'm sorry, I'm having trouble connecting right now. Please try again later or contact our support team."
+            }, event='error')
+            return
+        
+        response = ''.join(parts)
+        try:
+            append_exchange(conversation_id, user_message, response)
+        except Exception as e:
+            current_app.logger.error(f"Storing chat exchange failed: {str(e)}")
+        yield _sse({'response': response}, event='done')
+    
+    return Response(stream_with_context(generate()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @chatbot_bp.route('/clear', methods=['POST'])
 def clear_chat():
-    """Clear chat history"""
-    session.pop('chat_history', None)
+    """Clear chat history by starting a new conversation"""
+    session.pop('chat_conversation_id', None)
     return jsonify({'success': True, 'message': 'Chat history cleared'})
 
 @chatbot_bp.route('/history')
 def chat_history():
     """Get current chat history"""
-    history = session.get('chat_history', [])
-    return jsonify({'history': history})
\ No newline at end of file
+    if 'chat_conversation_id' not in session:
+        return jsonify({'history': []})
+    return jsonify({'history': recent_messages(session['chat_conversation_id'])})
+
+@chatbot_bp.route('/engine/stats')
+@stats_token_required
+def engine_stats():
+    """Concurrency, queue and coalescing counters for the chat engine in this worker"""
+    return jsonify(get_chat_engine().stats())
+
+@chatbot_bp.route('/cache/stats')
+@stats_token_required
+def cache_stats():
+    """Hit and miss counters for the response cache in this worker"""
+    return jsonify(get_response_cache().stats())
+
+@chatbot_bp.route('/sentiment')
+def conversation_sentiment():
+    """Get sentiment scores recorded for the current conversation"""
+    if 'chat_conversation_id' not in session:
+        return jsonify({'sentiment': []})
+    return jsonify({'sentiment': get_conversation_sentiment(session['chat_conversation_id'])})
@@ -0,0 +1,42 @@
+from app import db
+from models import ChatMessage
+from prompt_builder import count_tokens
+
+# Upper bound on rows read when packing history into a token budget
+MAX_HISTORY_ROWS = 50
+
+def append_exchange(conversation_id, user_message, response):
+    """Store a user message and the assistant reply in one transaction"""
+    db.session.add_all([
+        ChatMessage(conversation_id=conversation_id, role='user',
+                    content=user_message, tokens=count_tokens(user_message)),
+        ChatMessage(conversation_id=conversation_id, role='assistant',
+                    content=response, tokens=count_tokens(response)),
+    ])
+    db.session.commit()
+
+def load_history(conversation_id, token_budget):
+    """Most recent messages of a conversation that fit in `token_budget`, oldest first"""
+    rows = db.session.query(ChatMessage.role, ChatMessage.content, ChatMessage.tokens)\
+                     .filter(ChatMessage.conversation_id == conversation_id)\
+                     .order_by(ChatMessage.id.desc())\
+                     .limit(MAX_HISTORY_ROWS).all()
+    history = []
+    used = 0
+    for row in rows:
+        if used + row.tokens > token_budget:
+            break
+        used += row.tokens
+        history.append({"role": row.role, "content": row.content})
+    history.reverse()
+    # Never start the window on an assistant reply without its question
+    if history and history[0]['role'] == 'assistant':
+        history.pop(0)
+    return history
+
+def recent_messages(conversation_id, limit=MAX_HISTORY_ROWS):
+    """Last `limit` messages of a conversation for display, oldest first"""
+    rows = ChatMessage.query.filter_by(conversation_id=conversation_id)\
+                            .order_by(ChatMessage.id.desc())\
+                            .limit(limit).all()
+    return [row.to_message() for row in reversed(rows)]
@@ -0,0 +1,141 @@
+"""Local stand-in for the OpenAI chat completions API, for load testing.
+
+Run it and point the app at it:
+
+    python fake_openai_server.py --port 8089 --latency 0.5
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=test gunicorn ...
+
+Supports /v1/chat/completions (streaming and not) and /v1/embeddings. Each
+completion waits `--latency` seconds before the first token and then emits
+tokens at `--tokens-per-second`.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+REPLY = ("Thanks for reaching out to Digital Store support! All purchases are delivered "
+         "digitally right after checkout, and you can find them under your account.")
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.5
+    tokens_per_second = 50.0
+    requests_served = 0
+    counter_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        with self.counter_lock:
+            FakeOpenAIHandler.requests_served += 1
+        body = self._read_json()
+        if self.path.endswith('/chat/completions'):
+            return self._chat(body)
+        if self.path.endswith('/embeddings'):
+            return self._embeddings(body)
+        self._send_json(404, {'error': {'message': 'Not found'}})
+
+    def _chat(self, body):
+        time.sleep(self.latency)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        if body.get('response_format', {}).get('type') == 'json_object':
+            reply = json.dumps({'rating': 3, 'confidence': 0.7, 'urgent': False, 'emotion': 'neutral'})
+        else:
+            reply = REPLY
+        prompt_tokens = sum(len(str(m.get('content', '')).split()) for m in body.get('messages', []))
+        words = reply.split(' ')
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': len(words),
+                 'total_tokens': prompt_tokens + len(words)}
+
+        if not body.get('stream'):
+            time.sleep(len(words) / self.tokens_per_second)
+            return self._send_json(200, {
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model', 'gpt-4o'),
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': reply}}],
+                'usage': usage,
+            })
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def send(payload):
+            data = f"data: {payload}\n\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        for index, word in enumerate(words):
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': body.get('model', 'gpt-4o'),
+                'choices': [{'index': 0, 'finish_reason': None,
+                             'delta': {'content': word if index == 0 else ' ' + word}}],
+            }
+            send(json.dumps(chunk))
+            time.sleep(1 / self.tokens_per_second)
+        if body.get('stream_options', {}).get('include_usage'):
+            send(json.dumps({
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': body.get('model', 'gpt-4o'),
+                'choices': [],
+                'usage': usage,
+            }))
+        send('[DONE]')
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _embeddings(self, body):
+        text = body.get('input', '')
+        digest = hashlib.sha256(str(text).encode()).digest()
+        vector = [byte / 255 for byte in digest]
+        self._send_json(200, {
+            'object': 'list',
+            'data': [{'object': 'embedding', 'index': 0, 'embedding': vector}],
+            'model': body.get('model'),
+            'usage': {'prompt_tokens': 0, 'total_tokens': 0},
+        })
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds before the first token')
+    parser.add_argument('--tokens-per-second', type=float, default=50.0)
+    args = parser.parse_args()
+
+    FakeOpenAIHandler.latency = args.latency
+    FakeOpenAIHandler.tokens_per_second = args.tokens_per_second
+    server = ThreadingHTTPServer((args.host, args.port), FakeOpenAIHandler)
+    print(f"Fake OpenAI server on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Local stand-in for the PayPal REST API, for testing the PayPal client.
+
+Run it and point the app at it:
+
+    python fake_paypal_server.py --port 8090 --latency 0.2 --failure-rate 0.1
+    PAYPAL_API_BASE=http://127.0.0.1:8090 gunicorn ...
+
+Supports /v1/oauth2/token, /v2/checkout/orders and
+/v2/checkout/orders/<id>/capture. Order calls need a token it issued and
+replay the original result for a repeated PayPal-Request-Id, as PayPal
+does. Tests can script failures through the handler's class attributes.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+class FakePayPalHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    token_latency = 0.0
+    failure_rate = 0.0
+    expires_in = 32400
+    # Outcomes for the next order calls, consumed first: an HTTP status, or
+    # 'truncate' to break off a chunked body halfway
+    scripted = []
+    tokens = set()
+    replays = {}       # PayPal-Request-Id -> (status, body)
+    calls = []         # (path, PayPal-Request-Id) of every order call
+    token_requests = 0
+    lock = threading.Lock()
+
+    @classmethod
+    def reset(cls):
+        with cls.lock:
+            cls.latency = cls.token_latency = cls.failure_rate = 0.0
+            cls.expires_in = 32400
+            cls.scripted = []
+            cls.tokens = set()
+            cls.replays = {}
+            cls.calls = []
+            cls.token_requests = 0
+
+    @classmethod
+    def revoke_tokens(cls):
+        with cls.lock:
+            cls.tokens = set()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_truncated(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self.wfile.write(b"40\r\n{\"id\": \"")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length)
+        if self.path == '/v1/oauth2/token':
+            return self._token()
+        match = re.fullmatch(r'/v2/checkout/orders(?:/([^/]+)/capture)?', self.path)
+        if not match:
+            return self._send_json(404, {'name': 'RESOURCE_NOT_FOUND'})
+        self._order(match.group(1), json.loads(raw or b'{}'))
+
+    def _token(self):
+        time.sleep(self.token_latency)
+        token = f"A21AA{uuid.uuid4().hex}"
+        with self.lock:
+            FakePayPalHandler.token_requests += 1
+            self.tokens.add(token)
+        self._send_json(200, {'access_token': token, 'token_type': 'Bearer', 'expires_in': self.expires_in})
+
+    def _order(self, capture_id, body):
+        request_id = self.headers.get('PayPal-Request-Id')
+        authorization = self.headers.get('Authorization', '')
+        with self.lock:
+            self.calls.append((self.path, request_id))
+            outcome = self.scripted.pop(0) if self.scripted else None
+            authorized = authorization.removeprefix('Bearer ') in self.tokens
+            replay = self.replays.get(request_id)
+        time.sleep(self.latency)
+        if outcome == 'truncate':
+            return self._send_truncated()
+        if outcome is None and random.random() < self.failure_rate:
+            outcome = 503
+        if outcome is not None:
+            return self._send_json(outcome, {'name': 'SERVICE_UNAVAILABLE'})
+        if not authorized:
+            return self._send_json(401, {'error': 'invalid_token'})
+        if replay is None:
+            if capture_id:
+                replay = (201, {'id': capture_id, 'status': 'COMPLETED'})
+            else:
+                replay = (201, {'id': uuid.uuid4().hex[:17].upper(), 'status': 'CREATED',
+                                'purchase_units': body.get('purchase_units', [])})
+            if request_id:
+                with self.lock:
+                    replay = self.replays.setdefault(request_id, replay)
+        self._send_json(*replay)
+
+def serve(host='127.0.0.1', port=0):
+    """Start the server on a background thread and return it"""
+    server = ThreadingHTTPServer((host, port), FakePayPalHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds before each order call answers')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='share of order calls answered with 503')
+    args = parser.parse_args()
+
+    FakePayPalHandler.latency = args.latency
+    FakePayPalHandler.failure_rate = args.failure_rate
+    server = ThreadingHTTPServer((args.host, args.port), FakePayPalHandler)
+    print(f"Fake PayPal server on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+from datetime import timezone
+from functools import wraps
+from flask import current_app, request, session, make_response, Response
+from flask_login import current_user
+from sqlalchemy import func
+from app import db
+from models import Product
+from cache import LRUCache
+from catalog_events import on_products_changed
+from page_cache import visitor_variant
+import hashlib
+
+catalog_states = LRUCache(maxsize=1)
+
+@on_products_changed
+def _reset_catalog_state(upserted, deleted_ids):
+    catalog_states.clear()
+
+def catalog_state():
+    """(last modified, product count) of the whole catalog from one aggregate query.
+
+    The count catches deletes, which leave max(updated_at) unchanged. The
+    result is reused for CATALOG_STATE_TTL seconds and dropped on local writes.
+    """
+    state = catalog_states.get('catalog')
+    if state is None:
+        last_modified, count = db.session.query(func.max(Product.updated_at), func.count(Product.id)).one()
+        if last_modified is not None:
+            # HTTP dates have whole-second precision and are always UTC
+            last_modified = last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+        state = (last_modified, count)
+        catalog_states.set('catalog', state, ttl=current_app.config['CATALOG_STATE_TTL'])
+    return state
+
+def _is_personal():
+    """True when the page shows something specific to this visitor"""
+    return current_user.is_authenticated or 'cart_session_id' in session
+
+def conditional_page(view):
+    """Answer conditional GETs for a catalog page with 304 before rendering it.
+
+    The ETag covers the catalog state, the URL and the visitor variant used by
+    the page cache. Anonymous visitors without a cart get public responses a
+    shared cache may hold for CATALOG_MAX_AGE seconds; everyone else gets
+    private responses that must be revalidated on every use.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != 'GET' or '_flashes' in session:
+            return view(*args, **kwargs)
+        last_modified, count = catalog_state()
+        etag = hashlib.sha1(
+            f"{last_modified}:{count}:{request.full_path}:{visitor_variant()}".encode()
+        ).hexdigest()[:20]
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            since = request.if_modified_since
+            not_modified = since is not None and last_modified is not None and last_modified <= since
+        if not_modified:
+            response = Response(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag, weak=True)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        if _is_personal():
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+        else:
+            response.cache_control.public = True
+            response.cache_control.max_age = current_app.config['CATALOG_MAX_AGE']
+        response.vary.add('Cookie')
+        return response
+    return wrapper
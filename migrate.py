@@ -0,0 +1,150 @@
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.schema import CreateIndex
+from app import app, db
+from search import SEARCH_INDEX_SQL
+import click
+import logging
+import re
+
+def _concurrently(statement):
+    """Rewrite CREATE [UNIQUE] INDEX so PostgreSQL builds it without blocking writes"""
+    return re.sub(r'^CREATE (UNIQUE )?INDEX', r'CREATE \1INDEX CONCURRENTLY', statement, count=1)
+
+def create_missing_indexes():
+    """Create declared indexes that are missing from an existing database.
+
+    `db.create_all()` only creates indexes together with new tables, so
+    databases created before an index was declared need this step. Every
+    statement uses IF NOT EXISTS, so the step is safe to re-run. On PostgreSQL
+    indexes are built CONCURRENTLY to avoid locking large tables.
+    Returns the names of the indexes checked.
+    """
+    engine = db.engine
+    is_postgres = engine.dialect.name == 'postgresql'
+    inspector = inspect(engine)
+    statements = []
+    
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            statement = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+            statements.append((index.name, statement))
+    
+    if is_postgres:
+        statements.append(('ix_product_search', SEARCH_INDEX_SQL))
+    
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for name, statement in statements:
+            logging.info(f"Ensuring index {name}")
+            conn.execute(text(_concurrently(statement) if is_postgres else statement))
+    
+    return [name for name, _ in statements]
+
+@app.cli.command('migrate-indexes')
+def migrate_indexes_command():
+    """Create any missing database indexes"""
+    names = create_missing_indexes()
+    print(f"Indexes in place: {', '.join(names)}")
+
+def migrate_tags(batch_size=1000):
+    """Create the tag tables if needed and backfill them from Product.genre and Product.platform"""
+    from models import Tag, product_tag
+    from tags import backfill_tags
+    db.metadata.create_all(db.engine, tables=[Tag.__table__, product_tag], checkfirst=True)
+    return backfill_tags(batch_size)
+
+@app.cli.command('migrate-tags')
+def migrate_tags_command():
+    """Normalise genre and platform strings into tag tables"""
+    count = migrate_tags()
+    print(f"Tagged {count} products")
+
+def add_missing_columns(batch_size=1000):
+    """Add declared nullable columns missing from existing tables, then backfill Product.sku.
+
+    Like indexes, columns added to a model after its table was created are not
+    picked up by `db.create_all()`. Run `migrate-indexes` afterwards to build
+    the indexes on the new columns. Returns the "table.column" names added.
+    """
+    from sqlalchemy import select, update
+    from models import Product, product_sku
+    engine = db.engine
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    added = []
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}'))
+                added.append(f'{table.name}.{column.name}')
+
+    # Rows from before the sku column get the key an import would derive; the
+    # lowest id keeps it when titles collide and the rest get an "~id" suffix
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(Product.id, Product.category, Product.title)
+                .where(Product.sku.is_(None)).order_by(Product.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            keys = {row.id: product_sku(row.category, row.title) for row in rows}
+            taken = set(conn.scalars(select(Product.sku).where(Product.sku.in_(list(set(keys.values()))))))
+            values = []
+            for product_id, key in keys.items():
+                values.append({'b_id': product_id, 'sku': f"{key[:240]}~{product_id}" if key in taken else key})
+                taken.add(key)
+            conn.execute(update(Product.__table__).where(Product.id == bindparam('b_id')), values)
+        logging.info(f"Backfilled sku for {len(rows)} products")
+    return added
+
+@app.cli.command('migrate-columns')
+def migrate_columns_command():
+    """Add missing nullable columns and backfill derived values"""
+    added = add_missing_columns()
+    print(f"Columns added: {', '.join(added) or 'none'}")
+
+def init_db(seed=True):
+    """Bring the database up to the current schema, seeding an empty catalog.
+
+    Runs every migration step in order: new tables, new columns, indexes, and
+    tag links and related products for catalogs that predate them. Each step is idempotent, so this
+    is meant to run once per deploy, before workers start.
+    """
+    from sqlalchemy import select
+    from models import Product, ProductNeighbor, product_tag
+    from recommendations import refresh_neighbors
+    db.create_all()
+    steps = {'columns': add_missing_columns(), 'indexes': create_missing_indexes()}
+    has_products = db.session.execute(select(Product.id).limit(1)).first() is not None
+    has_tags = db.session.execute(select(product_tag.c.product_id).limit(1)).first() is not None
+    steps['tagged'] = migrate_tags() if has_products and not has_tags else 0
+    has_neighbors = db.session.execute(select(ProductNeighbor.product_id).limit(1)).first() is not None
+    steps['neighbors'] = refresh_neighbors() if has_products and not has_neighbors else 0
+    steps['seeded'] = False
+    if seed and not has_products:
+        from mock_data import initialize_mock_data
+        initialize_mock_data()
+        steps['seeded'] = True
+    return steps
+
+@app.cli.command('init-db')
+@click.option('--seed/--no-seed', default=True, help='Load the sample catalog into an empty database')
+def init_db_command(seed):
+    """Create or upgrade the schema and optionally seed sample data"""
+    steps = init_db(seed)
+    print(f"Columns added: {', '.join(steps['columns']) or 'none'}")
+    print(f"Indexes in place: {len(steps['indexes'])}")
+    if steps['tagged']:
+        print(f"Tagged {steps['tagged']} products")
+    if steps['neighbors']:
+        print(f"Computed related products for {steps['neighbors']} products")
+    if steps['seeded']:
+        print("Sample catalog loaded")
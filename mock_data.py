@@ -1,5 +1,5 @@
-from app import db
 from models import Product, CategoryType
+from catalog_import import import_records
 from datetime import date
 
 def initialize_mock_data():
@@ -10,7 +10,7 @@ def initialize_mock_data():
     
     # Movies
     movies = [
-        Product(
+        dict(
             title="The Matrix",
             description="A computer hacker learns from mysterious rebels about the true nature of his reality and his role in the war against its controllers.",
             price=14.99,
@@ -21,7 +21,7 @@ def initialize_mock_data():
             genre="Action, Sci-Fi",
             director="The Wachowskis"
         ),
-        Product(
+        dict(
             title="Inception",
             description="A thief who steals corporate secrets through dream-sharing technology is given the inverse task of planting an idea into the mind of a C.E.O.",
             price=12.99,
@@ -32,7 +32,7 @@ def initialize_mock_data():
             genre="Action, Sci-Fi, Thriller",
             director="Christopher Nolan"
         ),
-        Product(
+        dict(
             title="The Dark Knight",
             description="When the menace known as the Joker wreaks havoc and chaos on the people of Gotham, Batman must accept one of the greatest psychological and physical tests.",
             price=13.99,
@@ -43,7 +43,7 @@ def initialize_mock_data():
             genre="Action, Crime, Drama",
             director="Christopher Nolan"
         ),
-        Product(
+        dict(
             title="Pulp Fiction",
             description="The lives of two mob hitmen, a boxer, a gangster and his wife, and a pair of diner bandits intertwine in four tales of violence and redemption.",
             price=11.99,
@@ -54,7 +54,7 @@ def initialize_mock_data():
             genre="Crime, Drama",
             director="Quentin Tarantino"
         ),
-        Product(
+        dict(
             title="Avatar",
             description="A paraplegic Marine dispatched to the moon Pandora on a unique mission becomes torn between following his orders and protecting the world he feels is his home.",
             price=15.99,
@@ -65,7 +65,7 @@ def initialize_mock_data():
             genre="Action, Adventure, Fantasy",
             director="James Cameron"
         ),
-        Product(
+        dict(
             title="Interstellar",
             description="A team of explorers travel through a wormhole in space in an attempt to ensure humanity's survival.",
             price=14.99,
@@ -80,7 +80,7 @@ def initialize_mock_data():
     
     # Software
     software = [
-        Product(
+        dict(
             title="Adobe Photoshop 2024",
             description="The world's best imaging and graphic design software. Create and enhance photographs, illustrations, and 3D artwork.",
             price=239.88,
@@ -92,7 +92,7 @@ def initialize_mock_data():
             platform="Windows, Mac",
             developer="Adobe Systems"
         ),
-        Product(
+        dict(
             title="Microsoft Office 365",
             description="Get premium versions of Word, Excel, PowerPoint, and Outlook, plus 1TB of OneDrive cloud storage.",
             price=99.99,
@@ -104,7 +104,7 @@ def initialize_mock_data():
             platform="Windows, Mac, Web",
             developer="Microsoft"
         ),
-        Product(
+        dict(
             title="Visual Studio Code",
             description="Free source-code editor made by Microsoft for Windows, Linux and macOS. Features include support for debugging, syntax highlighting, and more.",
             price=0.00,
@@ -116,7 +116,7 @@ def initialize_mock_data():
             platform="Windows, Mac, Linux",
             developer="Microsoft"
         ),
-        Product(
+        dict(
             title="Slack",
             description="A messaging app for business that connects people to the information they need. Transform how you work with one place for everyone and everything you need.",
             price=8.00,
@@ -128,7 +128,7 @@ def initialize_mock_data():
             platform="Windows, Mac, Web, Mobile",
             developer="Slack Technologies"
         ),
-        Product(
+        dict(
             title="AutoCAD 2024",
             description="Computer-aided design software for 2D and 3D design and drafting. Used by architects, engineers, and construction professionals.",
             price=1690.00,
@@ -140,7 +140,7 @@ def initialize_mock_data():
             platform="Windows, Mac",
             developer="Autodesk"
         ),
-        Product(
+        dict(
             title="Figma",
             description="A collaborative interface design tool. Design, prototype, and gather feedback all in one place with Figma.",
             price=12.00,
@@ -152,7 +152,7 @@ def initialize_mock_data():
             platform="Web, Desktop",
             developer="Figma Inc."
         ),
-        Product(
+        dict(
             title="AnyDesk",
             description="Fast remote desktop software for secure connections to computers anywhere in the world. Perfect for remote work and support.",
             price=12.99,
@@ -164,7 +164,7 @@ def initialize_mock_data():
             platform="Windows, Mac, Linux, Mobile",
             developer="AnyDesk Software GmbH"
         ),
-        Product(
+        dict(
             title="FileZilla",
             description="Free FTP solution for file transfers. Supports FTP, FTPS and SFTP protocols with an intuitive interface.",
             price=0.00,
@@ -176,7 +176,7 @@ def initialize_mock_data():
             platform="Windows, Mac, Linux",
             developer="FileZilla Project"
         ),
-        Product(
+        dict(
             title="Turbo C++",
             description="Classic C++ IDE and compiler perfect for learning programming. Includes debugging tools and code editor.",
             price=9.99,
@@ -188,7 +188,7 @@ def initialize_mock_data():
             platform="Windows, DOS",
             developer="Borland"
         ),
-        Product(
+        dict(
             title="UltraViewer",
             description="Remote desktop software for technical support and remote access. Easy to use with secure connections.",
             price=19.99,
@@ -204,7 +204,7 @@ def initialize_mock_data():
     
     # Games
     games = [
-        Product(
+        dict(
             title="Cyberpunk 2077",
             description="An open-world, action-adventure story set in Night City, a megalopolis obsessed with power, glamour and body modification.",
             price=59.99,
@@ -216,7 +216,7 @@ def initialize_mock_data():
             platform="PC, PlayStation, Xbox",
             developer="CD Projekt Red"
         ),
-        Product(
+        dict(
             title="The Witcher 3: Wild Hunt",
             description="A story-driven, next-generation open world role-playing game set in a visually stunning fantasy universe full of meaningful choices.",
             price=39.99,
@@ -228,7 +228,7 @@ def initialize_mock_data():
             platform="PC, PlayStation, Xbox, Nintendo Switch",
             developer="CD Projekt Red"
         ),
-        Product(
+        dict(
             title="Grand Theft Auto V",
             description="When a young street hustler, a retired bank robber and a terrifying psychopath find themselves entangled with some of the most frightening and deranged elements of the criminal underworld.",
             price=29.99,
@@ -240,7 +240,7 @@ def initialize_mock_data():
             platform="PC, PlayStation, Xbox",
             developer="Rockstar Games"
         ),
-        Product(
+        dict(
             title="Red Dead Redemption 2",
             description="America, 1899. The end of the Wild West era has begun. After a robbery goes badly wrong in the western town of Blackwater, Arthur Morgan and the Van der Linde gang are forced to flee.",
             price=59.99,
@@ -252,7 +252,7 @@ def initialize_mock_data():
             platform="PC, PlayStation, Xbox",
             developer="Rockstar Games"
         ),
-        Product(
+        dict(
             title="Minecraft",
             description="A sandbox video game in which players explore a blocky, procedurally-generated 3D world, and may discover and extract raw materials, craft tools, and build structures.",
             price=26.95,
@@ -264,7 +264,7 @@ def initialize_mock_data():
             platform="PC, Mobile, Console",
             developer="Mojang Studios"
         ),
-        Product(
+        dict(
             title="Elden Ring",
             description="A fantasy action-RPG adventure set within a world full of mystery and peril. Journey through the Lands Between, a new fantasy world created by Hidetaka Miyazaki.",
             price=59.99,
@@ -278,10 +278,6 @@ def initialize_mock_data():
         )
     ]
     
-    # Add all products to database
-    for product_list in [movies, software, games]:
-        for product in product_list:
-            db.session.add(product)
-    
-    db.session.commit()
+    # Same validation and upsert path as `flask import-catalog`
+    import_records(movies + software + games)
     print("Mock data initialized successfully!")
@@ -1,8 +1,11 @@
 from datetime import datetime, timedelta
 from enum import Enum
 import secrets
+import re
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from sqlalchemy import event, select, update
+from sqlalchemy.orm.attributes import set_committed_value
 from app import db
 
 class CategoryType(Enum):
@@ -45,8 +48,15 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+def product_sku(category, title):
+    """Natural key for a product: its category plus a slug of its title"""
+    category = category.value if isinstance(category, CategoryType) else category
+    slug = re.sub(r'[^a-z0-9]+', '-', title.lower()).strip('-')
+    return f"{category}-{slug}"[:255]
+
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+    sku = db.Column(db.String(255), unique=True, index=True, nullable=True)  # Upsert key for catalog imports
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
     price = db.Column(db.Float, nullable=False)
@@ -80,7 +90,57 @@ class Product(db.Model):
             'developer': self.developer
         }
 
+def unique_sku(connection, key, product_id):
+    """`key` if no other product holds it, otherwise `key` suffixed with the product id.
+
+    Derived keys only contain [a-z0-9-], so the "~id" suffix cannot collide
+    with another derived key.
+    """
+    taken = connection.execute(
+        select(Product.id).where(Product.sku == key, Product.id != product_id).limit(1)
+    ).first()
+    return f"{key[:240]}~{product_id}" if taken else key
+
+@event.listens_for(Product, 'after_insert')
+def _derive_sku(mapper, connection, target):
+    # Products created outside an import get the key an import of the same
+    # title would use, unless another product already holds it
+    if target.sku is None:
+        sku = unique_sku(connection, product_sku(target.category, target.title), target.id)
+        connection.execute(update(Product).where(Product.id == target.id).values(sku=sku))
+        set_committed_value(target, 'sku', sku)
+
+@event.listens_for(Product, 'before_update')
+def _follow_renames(mapper, connection, target):
+    # A key derived from the old title would make the next import of the new
+    # title create a duplicate, so derived keys follow renames. Keys supplied
+    # by an import are external identifiers and never change.
+    state = db.inspect(target)
+    title, category = state.attrs.title.history, state.attrs.category.history
+    if not (title.deleted or category.deleted):
+        return
+    old_title = title.deleted[0] if title.deleted else target.title
+    old_category = category.deleted[0] if category.deleted else target.category
+    if target.sku is not None and target.sku.split('~')[0] == product_sku(old_category, old_title):
+        target.sku = unique_sku(connection, product_sku(target.category, target.title), target.id)
+
+# Sort key for rating order; unrated products sort last. Shared by the index
+# below and the category listing so the expressions match exactly.
+RATING_SORT_KEY = db.func.coalesce(Product.rating, db.literal_column('0'))
+
+# Composite indexes backing the keyset-paginated category listings. The leading
+# category column also serves the home page and related-products lookups.
+db.Index('ix_product_category_title', Product.category, Product.title, Product.id)
+db.Index('ix_product_category_price', Product.category, Product.price, Product.id)
+db.Index('ix_product_category_rating', Product.category, RATING_SORT_KEY, Product.id)
+
+# Lets max(updated_at) for HTTP validators be read from the end of an index
+db.Index('ix_product_updated_at', Product.updated_at)
+
 class CartItem(db.Model):
+    # Serves lookups by session alone and by (session, product) in add_to_cart
+    __table_args__ = (db.Index('ix_cart_item_session_product', 'session_id', 'product_id'),)
+    
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.String(255), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
@@ -90,14 +150,14 @@ class CartItem(db.Model):
     product = db.relationship('Product', backref='cart_items')
     
     def __repr__(self):
-        return f'<CartItem {self.product.title} x{self.quantity}>'
+        return f'<CartItem product={self.product_id} x{self.quantity}>'
 
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     order_number = db.Column(db.String(50), unique=True, nullable=False)
     session_id = db.Column(db.String(255), nullable=False)
     total_amount = db.Column(db.Float, nullable=False)
-    paypal_order_id = db.Column(db.String(100), nullable=True)
+    paypal_order_id = db.Column(db.String(100), nullable=True, index=True)
     status = db.Column(db.String(50), nullable=False, default='pending')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -105,8 +165,11 @@ class Order(db.Model):
         return f'<Order {self.order_number}>'
 
 class OrderItem(db.Model):
+    # Serves the co-purchase self-join used by the related-products engine
+    __table_args__ = (db.Index('ix_order_item_product_order', 'product_id', 'order_id'),)
+    
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)
@@ -115,4 +178,76 @@ class OrderItem(db.Model):
     product = db.relationship('Product', backref='order_items')
     
     def __repr__(self):
-        return f'<OrderItem {self.product.title} x{self.quantity}>'
+        return f'<OrderItem product={self.product_id} x{self.quantity}>'
+
+class Tag(db.Model):
+    """A genre or platform value split out of the comma-separated Product fields"""
+    __table_args__ = (db.UniqueConstraint('kind', 'key', name='uq_tag_kind_key'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'genre' or 'platform'
+    key = db.Column(db.String(100), nullable=False)  # lowercased name used for matching
+    name = db.Column(db.String(100), nullable=False)
+    
+    def __repr__(self):
+        return f'<Tag {self.kind}:{self.name}>'
+
+# Product <-> Tag links. The primary key serves tags by product; the index
+# serves products by tag for facet filters.
+product_tag = db.Table(
+    'product_tag',
+    db.Column('product_id', db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_product_tag_tag_product', 'tag_id', 'product_id')
+)
+
+class ProductNeighbor(db.Model):
+    """Precomputed related products; the primary key serves the per-product lookup in rank order"""
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    neighbor_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    
+    def __repr__(self):
+        return f'<ProductNeighbor {self.product_id} #{self.rank} -> {self.neighbor_id}>'
+
+class ChatMessage(db.Model):
+    # Serves loading a conversation newest-first
+    __table_args__ = (db.Index('ix_chat_message_conversation', 'conversation_id', 'id'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.String(64), nullable=False)
+    role = db.Column(db.String(20), nullable=False)  # 'user' or 'assistant'
+    content = db.Column(db.Text, nullable=False)
+    tokens = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ChatMessage {self.conversation_id} {self.role}>'
+    
+    def to_message(self):
+        return {"role": self.role, "content": self.content}
+
+class ChatSentiment(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.String(64), nullable=False, index=True)
+    message = db.Column(db.Text, nullable=False)
+    rating = db.Column(db.Integer, nullable=False)
+    confidence = db.Column(db.Float, nullable=False)
+    urgent = db.Column(db.Boolean, default=False)
+    emotion = db.Column(db.String(50), nullable=True)
+    source = db.Column(db.String(20), nullable=False)  # 'heuristic', 'llm', or 'llm_failed' (heuristic kept)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ChatSentiment {self.conversation_id} {self.rating}>'
+    
+    def to_dict(self):
+        return {
+            'rating': self.rating,
+            'confidence': self.confidence,
+            'urgent': self.urgent,
+            'emotion': self.emotion,
+            'source': self.source,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
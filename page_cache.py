@@ -0,0 +1,204 @@
+from collections import Counter
+from functools import wraps
+from flask import current_app, request, session, make_response, Response
+from flask_login import current_user
+from markupsafe import Markup
+from cache import LRUCache
+from catalog_events import on_products_changed
+from cart_service import get_cart_summary
+import logging
+import threading
+
+VERSION_KEY = 'catalog_version'
+
+class MemoryBackend:
+    """Page cache storage in this process's memory"""
+
+    def __init__(self, maxsize=512, ttl=300):
+        self.entries = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value):
+        self.entries.set(key, value)
+
+    def version(self):
+        return self._version
+
+    def bump_version(self):
+        with self._lock:
+            self._version += 1
+        # Old entries can never be read again; free them now rather than on eviction
+        self.entries.clear()
+
+class RedisBackend:
+    """Page cache storage in Redis, or any server speaking its protocol.
+
+    The catalog version lives in Redis too, so a write in one worker
+    invalidates the pages cached by every worker.
+    """
+
+    def __init__(self, url, ttl=300, prefix='page_cache:'):
+        import redis
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, value, ex=self.ttl or None)
+
+    def version(self):
+        return int(self.client.get(self.prefix + VERSION_KEY) or 0)
+
+    def bump_version(self):
+        self.client.incr(self.prefix + VERSION_KEY)
+
+class PageCache:
+    """Rendered pages and template fragments keyed by catalog version.
+
+    Every key embeds the current catalog version, which is bumped whenever
+    Product rows are committed, so stale entries are simply never looked up
+    again. Backend errors are logged and treated as misses.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def key(self, kind, *parts):
+        return ':'.join([kind, str(self.backend.version()), *map(str, parts)])
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logging.error(f"Page cache read failed: {e}")
+            value = None
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key, value):
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            logging.error(f"Page cache write failed: {e}")
+
+    def invalidate(self):
+        try:
+            self.backend.bump_version()
+        except Exception as e:
+            logging.error(f"Page cache invalidation failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats.get('hits', 0) + stats.get('misses', 0)
+        stats['hit_rate'] = stats.get('hits', 0) / lookups if lookups else 0.0
+        return stats
+
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+def get_page_cache():
+    """Process-wide page cache built from the app configuration"""
+    global _page_cache
+    if _page_cache is None:
+        with _page_cache_lock:
+            if _page_cache is None:
+                config = current_app.config
+                backend = None
+                if config['PAGE_CACHE_BACKEND'] == 'redis':
+                    try:
+                        backend = RedisBackend(config['PAGE_CACHE_REDIS_URL'], ttl=config['PAGE_CACHE_TTL'])
+                    except ImportError:
+                        # Pages are then cached per worker and invalidated only in the writing worker
+                        logging.warning("PAGE_CACHE_BACKEND is redis but the redis package is not installed; "
+                                        "using the in-memory page cache")
+                if backend is None:
+                    backend = MemoryBackend(maxsize=config['PAGE_CACHE_SIZE'], ttl=config['PAGE_CACHE_TTL'])
+                _page_cache = PageCache(backend)
+    return _page_cache
+
+@on_products_changed
+def _invalidate_pages(upserted, deleted_ids):
+    get_page_cache().invalidate()
+
+def visitor_variant():
+    """The parts of a visitor's state that change how catalog pages render"""
+    user = f"user{current_user.get_id()}" if current_user.is_authenticated else 'anon'
+    summary = get_cart_summary()
+    return f"{user}:cart{summary['count']}-{summary['items']}-{summary['total']}"
+
+def cached_page(view):
+    """Serve a GET view from the page cache, rendering and storing it on a miss.
+
+    Requests with pending flash messages bypass the cache, because the
+    messages are consumed by the render and are specific to one visitor.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_app.config['PAGE_CACHE_ENABLED'] or request.method != 'GET' or '_flashes' in session:
+            return view(*args, **kwargs)
+        cache = get_page_cache()
+        key = cache.key('page', request.full_path, visitor_variant())
+        body = cache.get(key)
+        if body is not None:
+            return Response(body, mimetype='text/html')
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and response.mimetype == 'text/html' and '_flashes' not in session:
+            cache.set(key, response.get_data(as_text=True))
+        return response
+    return wrapper
+
+def cached_fragment(name, *vary, caller=None):
+    """Template helper caching the body of a {% call %} block.
+
+    Usage: {% call cached_fragment('home-featured') %}...{% endcall %}.
+    Fragments are shared by all visitors, so only wrap markup that does not
+    depend on who is viewing it; pass anything else it varies on in `vary`.
+    """
+    if not current_app.config['PAGE_CACHE_ENABLED']:
+        return caller()
+    cache = get_page_cache()
+    key = cache.key('fragment', name, *vary)
+    body = cache.get(key)
+    if body is None:
+        body = str(caller())
+        cache.set(key, body)
+    return Markup(body)
+
+class Deferred:
+    """Sequence whose loader runs on first use.
+
+    Lets a view hand a template data that a cached fragment may never need,
+    so a fragment hit also skips the query behind it.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._items = None
+
+    def _load(self):
+        if self._items is None:
+            self._items = list(self._loader())
+        return self._items
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __bool__(self):
+        return bool(self._load())
@@ -0,0 +1,101 @@
+from sqlalchemy import and_, or_, tuple_
+import base64
+import json
+
+def encode_cursor(values):
+    """Encode the sort key of the last row on a page as an opaque URL-safe token"""
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(token):
+    """Decode a cursor token back into its sort key; returns None for an empty token"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+class KeysetPage:
+    """One page of keyset-paginated results.
+
+    Exposes `items`, `page` and `pages` like a Flask-SQLAlchemy pagination
+    object so existing templates keep rendering; templates move forward with
+    `next_cursor` instead of page numbers.
+    """
+
+    def __init__(self, items, next_cursor=None, cursor=None, total=None, per_page=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+        self.total = total
+        self.per_page = per_page
+        self.page = 1
+        self.pages = 1
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+def _check_cursor_values(sort_keys, values):
+    """Coerce cursor values to their sort columns' Python types, or raise ValueError.
+
+    A hand-edited cursor must fail here with the usual invalid-cursor error
+    rather than as a type error in the database.
+    """
+    if len(values) != len(sort_keys):
+        raise ValueError('Invalid cursor')
+    checked = []
+    for (expression, _), value in zip(sort_keys, values):
+        try:
+            python_type = expression.type.python_type
+        except NotImplementedError:
+            checked.append(value)
+            continue
+        if isinstance(value, bool) or value is None:
+            raise ValueError('Invalid cursor')
+        if python_type is float and isinstance(value, int):
+            value = float(value)
+        if not isinstance(value, python_type):
+            raise ValueError('Invalid cursor')
+        checked.append(value)
+    return checked
+
+def _seek_condition(sort_keys, values):
+    """Rows strictly after `values` in the given (expression, descending) order"""
+    directions = {descending for _, descending in sort_keys}
+    if len(directions) == 1:
+        row = tuple_(*[expression for expression, _ in sort_keys])
+        return row < tuple_(*values) if directions.pop() else row > tuple_(*values)
+    clauses = []
+    for i, (expression, descending) in enumerate(sort_keys):
+        equal = [sort_keys[j][0] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, expression < values[i] if descending else expression > values[i]))
+    return or_(*clauses)
+
+def keyset_paginate(query, sort_keys, cursor=None, per_page=12):
+    """Return a KeysetPage for `query` ordered by `sort_keys`.
+
+    `sort_keys` is a list of (expression, descending) pairs that must end in a
+    unique column so the order is total. Raises ValueError for a bad cursor.
+    """
+    after = decode_cursor(cursor)
+    if after is not None:
+        after = _check_cursor_values(sort_keys, after)
+        query = query.filter(_seek_condition(sort_keys, after))
+    keys = [expression.label(f'sort_key_{i}') for i, (expression, _) in enumerate(sort_keys)]
+    ordering = [expression.desc() if descending else expression for expression, descending in sort_keys]
+    rows = query.add_columns(*keys).order_by(*ordering).limit(per_page + 1).all()
+    next_cursor = encode_cursor(rows[per_page - 1][1:]) if len(rows) > per_page else None
+    return KeysetPage([row[0] for row in rows[:per_page]], next_cursor=next_cursor,
+                      cursor=cursor, per_page=per_page)
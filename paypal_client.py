@@ -0,0 +1,259 @@
+from collections import Counter
+from flask import current_app
+from requests.adapters import HTTPAdapter
+import logging
+import random
+import requests
+import threading
+import time
+import uuid
+
+# Upstream statuses that mean "try again later" rather than "bad request"
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+class PayPalError(Exception):
+    """Base class for PayPal client errors"""
+
+class PayPalAuthError(PayPalError):
+    """Raised when PayPal refuses to issue an access token"""
+
+class PayPalUnavailableError(PayPalError):
+    """Raised when PayPal cannot be reached or the circuit breaker is open"""
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    are rejected for `reset_timeout` seconds. Then a single trial call is let
+    through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logging.warning(f"PayPal circuit opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+class PayPalClient:
+    """PayPal REST client sharing one pooled HTTP session and one access token.
+
+    The OAuth token is cached until `token_margin` seconds before PayPal says
+    it expires. Refreshes are single-flight: concurrent requests in the same
+    process wait for the one in-progress refresh instead of each calling the
+    token endpoint.
+
+    Every call has connect and read timeouts. Idempotent calls are retried
+    with jittered exponential backoff; POSTs count as idempotent only when
+    they carry a PayPal-Request-Id, which is reused across attempts. A circuit
+    breaker rejects calls outright while PayPal is failing.
+    """
+
+    def __init__(self, client_id, client_secret, base_url, pool_size=10, token_margin=60,
+                 connect_timeout=3.05, read_timeout=10, max_retries=2, backoff=0.25,
+                 breaker=None):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.base_url = base_url.rstrip('/')
+        self.token_margin = token_margin
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._token = None
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+        self._counters = Counter()
+        self._counters_lock = threading.Lock()
+
+    def _count(self, name, amount=1):
+        with self._counters_lock:
+            self._counters[name] += amount
+
+    def metrics(self):
+        """Counters for outbound calls plus the circuit breaker state"""
+        with self._counters_lock:
+            metrics = dict(self._counters)
+        metrics['circuit_state'] = self.breaker.state
+        metrics['consecutive_failures'] = self.breaker.failures
+        return metrics
+
+    def _send(self, method, url, idempotent, **kwargs):
+        """Send one logical call through the breaker with timeouts and retries"""
+        attempts = 1 + (self.max_retries if idempotent else 0)
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                self._count('short_circuited')
+                raise PayPalUnavailableError("PayPal circuit breaker is open")
+            if attempt:
+                self._count('retries')
+                # Full jitter keeps retrying workers from synchronising
+                time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+            self._count('requests')
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except requests.Timeout as e:
+                self._count('timeouts')
+                self.breaker.record_failure()
+                error = e
+                continue
+            except requests.ConnectionError as e:
+                self._count('connection_errors')
+                self.breaker.record_failure()
+                error = e
+                continue
+            except requests.RequestException as e:
+                # Broken chunked bodies, undecodable content, redirect loops
+                self._count('request_errors')
+                self.breaker.record_failure()
+                error = e
+                continue
+            except Exception:
+                # Release a half-open trial whatever goes wrong, or the circuit never closes again
+                self.breaker.record_failure()
+                raise
+            finally:
+                self._count('latency_ms_total', int((time.monotonic() - started) * 1000))
+            if response.status_code in RETRYABLE_STATUSES:
+                self._count('server_errors')
+                self.breaker.record_failure()
+                if attempt + 1 < attempts:
+                    continue
+                return response
+            self.breaker.record_success()
+            return response
+        logging.error(f"PayPal {method} {url} failed after {attempts} attempts: {error}")
+        raise PayPalUnavailableError(str(error))
+
+    def _token_is_fresh(self):
+        return self._token is not None and time.monotonic() < self._token_expires_at
+
+    def access_token(self):
+        """Return a cached access token, fetching a new one if it is about to expire"""
+        if self._token_is_fresh():
+            return self._token
+        with self._token_lock:
+            # Another thread may have refreshed while we waited for the lock
+            if not self._token_is_fresh():
+                self._fetch_token()
+            return self._token
+
+    def invalidate_token(self):
+        with self._token_lock:
+            self._token = None
+            self._token_expires_at = 0.0
+
+    def _fetch_token(self):
+        self._count('token_fetches')
+        response = self._send(
+            'POST',
+            f"{self.base_url}/v1/oauth2/token",
+            idempotent=True,
+            headers={
+                "Accept": "application/json",
+                "Accept-Language": "en_US",
+            },
+            data="grant_type=client_credentials",
+            auth=(self.client_id, self.client_secret)
+        )
+        if response.status_code != 200:
+            logging.error(f"PayPal auth failed: {response.text}")
+            raise PayPalAuthError(f"Token request failed with status {response.status_code}")
+
+        result = response.json()
+        expires_in = int(result.get('expires_in', 0))
+        self._token = result['access_token']
+        self._token_expires_at = time.monotonic() + max(0, expires_in - self.token_margin)
+        logging.debug(f"Fetched PayPal access token valid for {expires_in}s")
+
+    def request(self, method, path, request_id=None, **kwargs):
+        """Send an authenticated request, retrying once with a new token on 401.
+
+        Passing `request_id` sets PayPal-Request-Id, which makes a POST safe
+        to retry because PayPal replays the original result for a repeated id.
+        """
+        headers = dict(kwargs.pop('headers', {}))
+        headers.setdefault("Content-Type", "application/json")
+        if request_id:
+            headers["PayPal-Request-Id"] = request_id
+        idempotent = method in ('GET', 'HEAD', 'PUT', 'DELETE') or bool(request_id)
+        for attempt in range(2):
+            headers["Authorization"] = f"Bearer {self.access_token()}"
+            response = self._send(method, f"{self.base_url}{path}", idempotent, headers=headers, **kwargs)
+            if response.status_code != 401 or attempt:
+                return response
+            # Token revoked or expired early; fetch a fresh one and try again
+            self.invalidate_token()
+        return response
+
+    def create_order(self, order_data, request_id=None):
+        return self.request('POST', '/v2/checkout/orders', request_id=request_id or str(uuid.uuid4()),
+                            json=order_data)
+
+    def capture_order(self, order_id, request_id=None):
+        return self.request('POST', f'/v2/checkout/orders/{order_id}/capture',
+                            request_id=request_id or str(uuid.uuid4()))
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_paypal_client():
+    """Process-wide PayPal client built from the app configuration"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                config = current_app.config
+                _client = PayPalClient(
+                    config['PAYPAL_CLIENT_ID'],
+                    config['PAYPAL_CLIENT_SECRET'],
+                    config['PAYPAL_API_BASE'],
+                    pool_size=config['PAYPAL_POOL_SIZE'],
+                    connect_timeout=config['PAYPAL_CONNECT_TIMEOUT'],
+                    read_timeout=config['PAYPAL_READ_TIMEOUT'],
+                    max_retries=config['PAYPAL_MAX_RETRIES'],
+                    breaker=CircuitBreaker(
+                        failure_threshold=config['PAYPAL_BREAKER_THRESHOLD'],
+                        reset_timeout=config['PAYPAL_BREAKER_RESET']
+                    )
+                )
+    return _client
@@ -0,0 +1,79 @@
+from flask import abort, current_app
+from sqlalchemy import event
+from app import db
+from models import Product
+from cache import LRUCache
+from catalog_events import on_products_changed
+import threading
+
+class ProductSnapshot:
+    """Detached, read-only copy of a product's columns.
+
+    Slots keep each cached entry small and let templates and views read the
+    same attributes as on a Product instance.
+    """
+
+    __slots__ = tuple(column.key for column in Product.__table__.columns)
+
+    def __init__(self, row):
+        for name in self.__slots__:
+            setattr(self, name, getattr(row, name))
+
+    # Product.to_dict only reads attributes, so it works on snapshots unchanged
+    to_dict = Product.to_dict
+
+    def __repr__(self):
+        return f'<ProductSnapshot {self.title}>'
+
+_columns = [getattr(Product, name) for name in ProductSnapshot.__slots__]
+
+_products = None
+_products_lock = threading.Lock()
+
+def get_product_cache():
+    """Process-wide LRU of product snapshots built from the app configuration"""
+    global _products
+    if _products is None:
+        with _products_lock:
+            if _products is None:
+                _products = LRUCache(
+                    maxsize=current_app.config['PRODUCT_CACHE_SIZE'],
+                    ttl=current_app.config['PRODUCT_CACHE_TTL']
+                )
+    return _products
+
+def get_product(product_id):
+    """Snapshot of a product, read through the cache; None if it does not exist"""
+    cache = get_product_cache()
+    snapshot = cache.get(product_id)
+    if snapshot is None:
+        row = db.session.query(*_columns).filter(Product.id == product_id).first()
+        if row is None:
+            return None
+        snapshot = ProductSnapshot(row)
+        cache.set(product_id, snapshot)
+    return snapshot
+
+def get_product_or_404(product_id):
+    snapshot = get_product(product_id)
+    if snapshot is None:
+        abort(404)
+    return snapshot
+
+def _evict(product_id):
+    if _products is not None:
+        _products.delete(product_id)
+
+@event.listens_for(Product, 'after_update')
+@event.listens_for(Product, 'after_delete')
+def _evict_on_flush(mapper, connection, target):
+    _evict(target.id)
+
+@on_products_changed
+def _evict_on_commit(upserted, deleted_ids):
+    # Evict again after commit: a read between flush and commit may have
+    # cached the previous committed row
+    for row in upserted:
+        _evict(row['id'])
+    for product_id in deleted_ids:
+        _evict(product_id)
@@ -0,0 +1,73 @@
+import logging
+import threading
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+# Tokens added per chat message for role and separators
+MESSAGE_OVERHEAD = 4
+
+def _get_encoding():
+    """Load the tiktoken encoding on first use; it may be fetched over the network"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding('o200k_base')
+                except Exception as e:  # tiktoken missing or its encoding files unavailable
+                    logging.warning(f"Estimating prompt tokens, tiktoken is unavailable: {e}")
+                _encoding_loaded = True
+    return _encoding
+
+def count_tokens(text):
+    """Token count for text, using tiktoken when installed and an estimate otherwise"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return max(1, (len(text) + 3) // 4)
+
+def message_tokens(message):
+    return count_tokens(message['content']) + MESSAGE_OVERHEAD
+
+def compact_text(text):
+    """Strip per-line indentation and blank lines so prompts carry no padding tokens"""
+    return '\n'.join(line.strip() for line in text.strip().splitlines() if line.strip())
+
+class PromptBuilder:
+    """Builds chat prompts that fit a token budget.
+
+    The system prompt, catalog facts and the new user message are always
+    sent; history is packed newest-first into whatever budget remains, so
+    older turns are dropped before newer ones.
+    """
+
+    def __init__(self, system_prompt):
+        self.system_prompt = compact_text(system_prompt)
+
+    def build(self, user_message, conversation_history=None, token_budget=3000, facts=()):
+        """Return (messages, estimated prompt tokens)"""
+        system = self.system_prompt
+        if facts:
+            system += "\nCatalog facts relevant to this question:\n" + '\n'.join(facts)
+        head = [{"role": "system", "content": system}]
+        tail = [{"role": "user", "content": user_message}]
+        used = sum(message_tokens(message) for message in head + tail)
+
+        packed = []
+        for message in reversed(conversation_history or []):
+            cost = message_tokens(message)
+            if used + cost > token_budget:
+                break
+            used += cost
+            packed.append(message)
+        packed.reverse()
+        # Never start the window on an assistant reply without its question
+        while packed and packed[0]['role'] == 'assistant':
+            used -= message_tokens(packed.pop(0))
+
+        return head + packed + tail, used
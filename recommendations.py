@@ -0,0 +1,350 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.orm import Session, aliased
+from app import app, db
+from models import Product, ProductNeighbor, Order, OrderItem
+import click
+import similarity
+import logging
+import threading
+import time
+
+# Weight of a shared value in each descriptive field. Credits are more telling
+# than genres, and platforms are shared by most of the catalog.
+FEATURE_WEIGHTS = {
+    'director': 2.0,
+    'developer': 1.5,
+    'genre': 1.0,
+    'platform': 0.5,
+}
+
+# How much a full co-purchase signal adds on top of content similarity (0..1)
+CO_PURCHASE_WEIGHT = 0.75
+
+# Products recomputed per transaction during a refresh
+REFRESH_BATCH_SIZE = 500
+
+# Features shared by more products than this (a common platform or genre) say
+# little about which neighbour lists an edit affects, so they do not widen a refresh
+EXPAND_MAX_POSTING = 200
+
+# Columns whose edits can change similarity scores
+NEIGHBOR_COLUMNS = ('category', *FEATURE_WEIGHTS)
+
+# Refreshes touching at least this many products use the vectorised scorer when available
+VECTORISED_MIN_PRODUCTS = 1000
+
+def parse_values(text):
+    """Split a comma-separated field such as "Action, Sci-Fi" into normalised values"""
+    return [value.strip().lower() for value in text.split(',') if value.strip()] if text else []
+
+class CatalogFeatures:
+    """Weighted feature sets for every product with an inverted index over them.
+
+    Similarity between two products of the same category is the weighted
+    Jaccard overlap of their features. Candidates come from the inverted
+    index, so each product is only compared with products it shares a
+    feature with.
+    """
+
+    def __init__(self, rows):
+        self.features = {}                # product_id -> {feature: weight}
+        self.totals = {}                  # product_id -> sum of feature weights
+        self.categories = {}              # product_id -> category
+        self.postings = defaultdict(set)  # feature -> product ids
+        self.by_rating = defaultdict(list)
+        for row in rows:
+            features = {}
+            for field, weight in FEATURE_WEIGHTS.items():
+                for value in parse_values(getattr(row, field)):
+                    features[f'{field}:{value}'] = weight
+            self.features[row.id] = features
+            self.totals[row.id] = sum(features.values())
+            self.categories[row.id] = row.category
+            self.by_rating[row.category].append((-(row.rating or 0), row.id))
+            for feature in features:
+                self.postings[feature].add(row.id)
+        for ranked in self.by_rating.values():
+            ranked.sort()
+
+    @classmethod
+    def load(cls, categories=None):
+        """Features of the whole catalog, or of the given categories only"""
+        columns = [Product.id, Product.category, Product.rating, *(getattr(Product, field) for field in FEATURE_WEIGHTS)]
+        query = db.session.query(*columns)
+        if categories is not None:
+            query = query.filter(Product.category.in_(list(categories)))
+        return cls(query)
+
+    def similar(self, product_id):
+        """{other product id: similarity} for same-category products sharing a feature"""
+        features = self.features.get(product_id)
+        if not features:
+            return {}
+        category = self.categories[product_id]
+        shared = defaultdict(float)
+        for feature, weight in features.items():
+            for other in self.postings[feature]:
+                if other != product_id and self.categories[other] == category:
+                    shared[other] += weight
+        total = self.totals[product_id]
+        return {other: overlap / (total + self.totals[other] - overlap) for other, overlap in shared.items()}
+
+    def sharing_features(self, product_ids, max_posting=EXPAND_MAX_POSTING):
+        """Ids of products whose neighbours may change when these products change.
+
+        Features held by more than `max_posting` products are skipped: one
+        more or less product sharing them barely moves anyone's ranking.
+        """
+        related = set()
+        for product_id in product_ids:
+            for feature in self.features.get(product_id, ()):
+                if len(self.postings[feature]) <= max_posting:
+                    related |= self.postings[feature]
+        return related
+
+def co_purchase_counts(product_ids):
+    """{product id: {other product id: completed orders containing both}}"""
+    mine, other = aliased(OrderItem), aliased(OrderItem)
+    rows = db.session.query(mine.product_id, other.product_id, func.count(func.distinct(mine.order_id)))\
+                     .join(other, (other.order_id == mine.order_id) & (other.product_id != mine.product_id))\
+                     .join(Order, Order.id == mine.order_id)\
+                     .filter(Order.status == 'completed', mine.product_id.in_(product_ids))\
+                     .group_by(mine.product_id, other.product_id)
+    counts = defaultdict(dict)
+    for product_id, other_id, orders in rows:
+        counts[product_id][other_id] = orders
+    return counts
+
+def _top_similar(catalog, product_id, co_purchases, limit):
+    scores = catalog.similar(product_id)
+    bought = co_purchases.get(product_id, {})
+    if bought:
+        most = max(bought.values())
+        for other, orders in bought.items():
+            scores[other] = scores.get(other, 0.0) + CO_PURCHASE_WEIGHT * orders / most
+    return sorted(scores.items(), key=lambda item: (-round(item[1], 6), item[0]))[:limit]
+
+def compute_neighbors(catalog, product_ids, limit, matrix=None):
+    """{product id: [(neighbour id, score), ...]} best first, at most `limit` each.
+
+    Scores come from `matrix` (a similarity.SimilarityMatrix) when given and
+    from the per-product inverted index otherwise; both give the same scores.
+    Slots left after similarity and co-purchase signals are filled with the
+    best-rated products of the same category, so every product has a full set.
+    """
+    product_ids = [product_id for product_id in product_ids if product_id in catalog.categories]
+    co_purchases = co_purchase_counts(product_ids)
+    if matrix is not None:
+        scored = matrix.top_neighbors(product_ids, limit, co_purchases, CO_PURCHASE_WEIGHT)
+    else:
+        scored = {product_id: _top_similar(catalog, product_id, co_purchases, limit) for product_id in product_ids}
+    neighbors = {}
+    for product_id in product_ids:
+        ranked = scored.get(product_id, [])
+        if len(ranked) < limit:
+            chosen = {other for other, _ in ranked}
+            for _, other in catalog.by_rating[catalog.categories[product_id]]:
+                if other != product_id and other not in chosen:
+                    ranked.append((other, 0.0))
+                    if len(ranked) >= limit:
+                        break
+        neighbors[product_id] = ranked
+    return neighbors
+
+def store_neighbors(neighbors):
+    """Replace the stored neighbours of the given products in one transaction"""
+    if not neighbors:
+        return
+    rows = [
+        {'product_id': product_id, 'rank': rank, 'neighbor_id': other, 'score': round(score, 6)}
+        for product_id, ranked in neighbors.items()
+        for rank, (other, score) in enumerate(ranked)
+    ]
+    try:
+        db.session.execute(delete(ProductNeighbor).where(ProductNeighbor.product_id.in_(list(neighbors))))
+        if rows:
+            db.session.execute(insert(ProductNeighbor), rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+def refresh_neighbors(product_ids=None, expand=False):
+    """Recompute and store neighbours for some products, or for all of them.
+
+    With `expand`, products sharing a distinctive feature with the given ones,
+    or listing one of them as a neighbour, are refreshed too; use it after
+    catalog edits. Only the categories of the refreshed products are loaded.
+    Returns the number of products refreshed.
+    """
+    if product_ids is None:
+        catalog = CatalogFeatures.load()
+        targets = set(catalog.categories)
+    else:
+        targets = set(product_ids)
+        if expand:
+            targets |= set(db.session.scalars(
+                select(ProductNeighbor.product_id).where(ProductNeighbor.neighbor_id.in_(list(product_ids)))
+            ))
+        categories = set(db.session.scalars(select(Product.category).where(Product.id.in_(list(targets))).distinct()))
+        catalog = CatalogFeatures.load(categories)
+        if expand:
+            targets |= catalog.sharing_features(product_ids)
+        targets &= set(catalog.categories)
+    limit = current_app.config['RECOMMENDATION_NEIGHBORS']
+    targets = sorted(targets)
+    matrix = None
+    if similarity.available() and len(targets) >= VECTORISED_MIN_PRODUCTS:
+        matrix = similarity.SimilarityMatrix(catalog, memory_mb=current_app.config['SIMILARITY_MEMORY_MB'])
+    for start in range(0, len(targets), REFRESH_BATCH_SIZE):
+        store_neighbors(compute_neighbors(catalog, targets[start:start + REFRESH_BATCH_SIZE], limit, matrix))
+    return len(targets)
+
+def related_products(product, limit=4):
+    """Precomputed related products for a product page, best first"""
+    products = Product.query.join(ProductNeighbor, ProductNeighbor.neighbor_id == Product.id)\
+                            .filter(ProductNeighbor.product_id == product.id)\
+                            .order_by(ProductNeighbor.rank)\
+                            .limit(limit).all()
+    if products:
+        return products
+    # Not computed yet, e.g. a product added moments ago
+    return Product.query.filter_by(category=product.category)\
+                        .filter(Product.id != product.id)\
+                        .limit(limit).all()
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = {}  # product id -> expand flag, waiting for the background refresh
+_pending_lock = threading.Lock()
+_ordered = set()  # product ids from completed orders, waiting for the batched refresh
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # One worker so refreshes never race each other on the same rows
+                _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='recommendations')
+    return _executor
+
+def _run_pending_refresh(app):
+    with _pending_lock:
+        pending = dict(_pending)
+        _pending.clear()
+    if not pending:
+        return
+    expanded = [product_id for product_id, expand in pending.items() if expand]
+    direct = [product_id for product_id, expand in pending.items() if not expand]
+    started = time.monotonic()
+    with app.app_context():
+        try:
+            count = 0
+            if expanded:
+                count += refresh_neighbors(expanded, expand=True)
+            if direct:
+                count += refresh_neighbors(direct)
+            logging.debug(f"Refreshed neighbours of {count} products in {time.monotonic() - started:.3f}s")
+        except Exception as e:
+            logging.error(f"Refreshing related products failed: {e}")
+        finally:
+            db.session.remove()
+
+def _queue_refresh(app, product_ids, expand):
+    with _pending_lock:
+        was_idle = not _pending
+        for product_id in product_ids:
+            _pending[product_id] = _pending.get(product_id, False) or expand
+    if was_idle and _pending:
+        _get_executor().submit(_run_pending_refresh, app)
+
+def schedule_refresh(product_ids, expand=False):
+    """Queue a background neighbour refresh for the given products.
+
+    Ids queued while a refresh is waiting to start are merged into it, so a
+    burst of writes costs one refresh.
+    """
+    _queue_refresh(current_app._get_current_object(), product_ids, expand)
+
+def _release_ordered(app):
+    with _pending_lock:
+        product_ids = list(_ordered)
+        _ordered.clear()
+    _queue_refresh(app, product_ids, False)
+
+def schedule_order_refresh(product_ids):
+    """Queue a neighbour refresh for products whose co-purchase counts changed.
+
+    Each refresh loads whole categories, so completed orders are collected for
+    RECOMMENDATIONS_ORDER_DELAY seconds and refreshed together rather than
+    one order at a time.
+    """
+    with _pending_lock:
+        was_idle = not _ordered
+        _ordered.update(product_ids)
+    if was_idle and _ordered:
+        timer = threading.Timer(current_app.config['RECOMMENDATIONS_ORDER_DELAY'], _release_ordered,
+                                args=(current_app._get_current_object(),))
+        timer.daemon = True
+        timer.start()
+
+def _run_rebuild(app):
+    started = time.monotonic()
+    with app.app_context():
+        try:
+            count = refresh_neighbors()
+            logging.info(f"Rebuilt neighbours of {count} products in {time.monotonic() - started:.1f}s")
+        except Exception as e:
+            logging.error(f"Rebuilding related products failed: {e}")
+        finally:
+            db.session.remove()
+
+def schedule_rebuild():
+    """Queue a background neighbour refresh of the whole catalog, e.g. after a bulk import"""
+    _get_executor().submit(_run_rebuild, current_app._get_current_object())
+
+@event.listens_for(Session, 'after_flush')
+def _collect_feature_changes(session, flush_context):
+    # Only edits that can move similarity scores count; price or stock edits do not
+    changed = session.info.setdefault('neighbor_changes', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Product) or obj.id is None:
+            continue
+        state = db.inspect(obj)
+        if obj in session.dirty and not any(state.attrs[field].history.has_changes() for field in NEIGHBOR_COLUMNS):
+            continue
+        changed.add(obj.id)
+
+@event.listens_for(Session, 'after_commit')
+def _refresh_changed_products(session):
+    changed = session.info.pop('neighbor_changes', None)
+    if changed and current_app.config['RECOMMENDATIONS_AUTO_REFRESH']:
+        schedule_refresh(changed, expand=True)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_feature_changes(session):
+    session.info.pop('neighbor_changes', None)
+
+@app.cli.command('rebuild-recommendations')
+def rebuild_recommendations_command():
+    """Recompute related products for the whole catalog"""
+    started = time.monotonic()
+    count = refresh_neighbors()
+    print(f"Computed neighbours for {count} products in {time.monotonic() - started:.2f}s")
+
+@app.cli.command('benchmark-similarity')
+@click.option('--sizes', default='500,5000,20000,100000', help='Comma-separated synthetic catalog sizes')
+@click.option('--python-max', default=20000, help='Largest size also timed with the pure-Python scorer')
+def benchmark_similarity_command(sizes, python_max):
+    """Time all-pairs similarity on synthetic catalogs of growing size"""
+    if not similarity.available():
+        raise click.ClickException("NumPy and SciPy are required for the vectorised scorer")
+    sizes = [int(size) for size in sizes.split(',')]
+    memory_mb = current_app.config['SIMILARITY_MEMORY_MB']
+    print(f"{'products':>10} {'vectorised':>12} {'pure python':>12}")
+    for size, vectorised, python in similarity.benchmark(sizes, python_max=python_max, memory_mb=memory_mb):
+        python = f"{python:.2f}s" if python is not None else '-'
+        print(f"{size:>10} {vectorised:>11.2f}s {python:>12}")
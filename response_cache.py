@@ -0,0 +1,160 @@
+from collections import Counter
+from flask import current_app
+from cache import LRUCache
+from catalog_events import on_products_changed
+import hashlib
+import json
+import logging
+import math
+import operator
+import re
+import threading
+
+# Words that make a message lean on earlier turns ("is it available on PC?")
+CONTEXT_WORDS = {
+    'it', 'its', "it's", 'that', 'this', 'those', 'these', 'they', 'them', 'their',
+    'he', 'she', 'him', 'her', 'one', 'ones', 'same', 'above', 'previous', 'earlier',
+    'again', 'else', 'also', 'too', 'more',
+}
+# Short replies that only make sense as answers to the previous turn
+FOLLOW_UPS = {'yes', 'no', 'ok', 'okay', 'sure', 'why', 'how', 'really', 'thanks', 'thank you'}
+
+_NON_WORD_RE = re.compile(r"[^\w\s']+")
+_SPACE_RE = re.compile(r'\s+')
+
+def normalize_message(message):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = _NON_WORD_RE.sub(' ', message.lower())
+    return _SPACE_RE.sub(' ', text).strip()
+
+def is_context_dependent(normalized, conversation_history):
+    """True when the answer likely depends on earlier turns of the conversation"""
+    if not conversation_history:
+        return False
+    return normalized in FOLLOW_UPS or any(word in CONTEXT_WORDS for word in normalized.split())
+
+def _unit(vector):
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+class ResponseCache:
+    """Cache of chatbot answers for repeated questions.
+
+    Keys combine the normalised message with a hash of the last
+    `history_window` history messages. Messages that refer back to the
+    conversation bypass the cache entirely. With an `embed` function,
+    exact misses fall back to the closest cached question with the same
+    history hash if its cosine similarity reaches `similarity_threshold`.
+    """
+
+    def __init__(self, maxsize=512, ttl=3600, history_window=2, embed=None, similarity_threshold=0.92):
+        self.entries = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.history_window = history_window
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self._vectors = {}  # key -> unit embedding of the cached question
+        self._lock = threading.Lock()
+        self.counters = Counter()
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _key(self, normalized, conversation_history):
+        window = (conversation_history or [])[-self.history_window:] if self.history_window else []
+        digest = hashlib.sha256(json.dumps(window, sort_keys=True).encode()).hexdigest()[:16]
+        return (normalized, digest)
+
+    def _similar(self, key, vector):
+        best_key, best_score = None, self.similarity_threshold
+        with self._lock:
+            candidates = [(k, v) for k, v in self._vectors.items() if k[1] == key[1]]
+        for candidate, candidate_vector in candidates:
+            score = sum(map(operator.mul, vector, candidate_vector))
+            if score >= best_score:
+                best_key, best_score = candidate, score
+        return best_key
+
+    def lookup(self, message, conversation_history=None):
+        """Return (cached answer or None, cache key or None when bypassed)"""
+        normalized = normalize_message(message)
+        if not normalized or is_context_dependent(normalized, conversation_history):
+            self._count('bypass')
+            return None, None
+        key = self._key(normalized, conversation_history)
+        answer = self.entries.get(key)
+        if answer is not None:
+            self._count('hits')
+            return answer, key
+        if self.embed:
+            try:
+                vector = _unit(self.embed(normalized))
+            except Exception as e:
+                logging.error(f"Embedding lookup failed: {e}")
+                vector = None
+            if vector is not None:
+                similar = self._similar(key, vector)
+                answer = self.entries.get(similar) if similar else None
+                if answer is not None:
+                    self._count('semantic_hits')
+                    return answer, key
+                with self._lock:
+                    # Remember the vector so store() does not embed again
+                    self._vectors[key] = vector
+        self._count('misses')
+        return None, key
+
+    def store(self, key, answer):
+        if key is None:
+            return
+        self.entries.set(key, answer)
+        with self._lock:
+            # Drop vectors whose answers were evicted or expired
+            if len(self._vectors) > self.entries.maxsize:
+                live = set(self.entries.keys())
+                self._vectors = {k: v for k, v in self._vectors.items() if k in live}
+
+    def clear(self):
+        self.entries.clear()
+        with self._lock:
+            self._vectors.clear()
+
+    def stats(self):
+        lookups = self.counters['hits'] + self.counters['semantic_hits'] + self.counters['misses']
+        hits = self.counters['hits'] + self.counters['semantic_hits']
+        return {
+            'size': len(self.entries),
+            'hits': self.counters['hits'],
+            'semantic_hits': self.counters['semantic_hits'],
+            'misses': self.counters['misses'],
+            'bypass': self.counters['bypass'],
+            'hit_rate': hits / lookups if lookups else 0.0,
+        }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Process-wide chatbot response cache built from the app configuration"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = current_app.config
+                embed = None
+                if config['CHATBOT_CACHE_SEMANTIC']:
+                    from chatbot import embed_text
+                    embed = embed_text
+                _cache = ResponseCache(
+                    maxsize=config['CHATBOT_CACHE_SIZE'],
+                    ttl=config['CHATBOT_CACHE_TTL'],
+                    history_window=config['CHATBOT_CACHE_HISTORY_WINDOW'],
+                    embed=embed
+                )
+    return _cache
+
+@on_products_changed
+def _clear_on_catalog_change(upserted, deleted_ids):
+    # Answers quote catalog facts such as prices, so a write makes them stale
+    if _cache is not None:
+        _cache.clear()
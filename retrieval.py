@@ -0,0 +1,253 @@
+from collections import Counter, defaultdict
+from flask import current_app
+from app import db
+from models import Product, CategoryType
+from catalog_events import on_products_changed
+from search import tokenize
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+
+# Fields indexed for retrieval and how many times each one's tokens count
+FIELD_BOOSTS = {
+    'title': 3,
+    'genre': 2,
+    'director': 2,
+    'developer': 2,
+    'platform': 2,
+    'category': 1,
+    'description': 1,
+}
+
+# Columns kept in memory so facts can be rendered without a database round trip
+_FACT_COLUMNS = ['id', 'title', 'category', 'price', 'rating', 'genre', 'platform', 'director', 'developer']
+_INDEX_COLUMNS = [*_FACT_COLUMNS, 'description']
+
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'can', 'do', 'does', 'for', 'from', 'have', 'how',
+    'i', 'in', 'is', 'it', 'me', 'my', 'of', 'on', 'or', 'the', 'there', 'this', 'to', 'was',
+    'what', 'when', 'which', 'who', 'will', 'with', 'you', 'your', 'any', 'about', 'much', 'get',
+}
+
+def _category_value(category):
+    return category.value if isinstance(category, CategoryType) else category
+
+def _terms(text):
+    return [token for token in tokenize(text) if token not in STOP_WORDS]
+
+def _title_words(text):
+    return tuple(re.findall(r'\w+', (text or '').lower()))
+
+def product_fact(row):
+    """One compact line of catalog facts for a product row"""
+    parts = [_category_value(row['category']), f"${row['price']:.2f}"]
+    if row.get('rating') is not None:
+        parts.append(f"rated {row['rating']}/10")
+    if row.get('genre'):
+        parts.append(row['genre'])
+    if row.get('platform'):
+        parts.append(row['platform'])
+    if row.get('director'):
+        parts.append(f"dir. {row['director']}")
+    if row.get('developer'):
+        parts.append(f"by {row['developer']}")
+    return f"- {row['title']}: {'; '.join(parts)}"
+
+class CatalogRetriever:
+    """In-memory BM25 index over the product catalog for grounding chat answers.
+
+    Documents are updated one at a time as products change, keeping document
+    frequencies and the average length current, so there is no full rebuild
+    on writes. Queries touch only the postings of their own terms.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)    # term -> {product_id: term frequency}
+        self._documents = {}                  # product_id -> set of terms
+        self._lengths = {}                    # product_id -> document length
+        self._rows = {}                       # product_id -> row used for facts
+        self._total_length = 0
+        self._titles = {}                     # word trie of titles; a node's None key holds the ids ending there
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._rows)
+
+    def build(self, rows):
+        """Replace the index contents with the given product rows"""
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            self._lengths.clear()
+            self._rows.clear()
+            self._titles.clear()
+            self._total_length = 0
+            for row in rows:
+                self._add(row)
+            self.built_at = time.monotonic()
+
+    def add(self, row):
+        """Index or re-index a single product"""
+        with self._lock:
+            self._remove(row['id'])
+            self._add(row)
+
+    def remove(self, product_id):
+        """Drop a product from the index"""
+        with self._lock:
+            self._remove(product_id)
+
+    def _add(self, row):
+        product_id = row['id']
+        counts = Counter()
+        for field, boost in FIELD_BOOSTS.items():
+            value = row.get(field)
+            if field == 'category':
+                value = _category_value(value)
+            for term in _terms(value):
+                counts[term] += boost
+        for term, count in counts.items():
+            self._postings[term][product_id] = count
+        length = sum(counts.values())
+        self._documents[product_id] = set(counts)
+        self._lengths[product_id] = length
+        self._total_length += length
+        self._rows[product_id] = {column: row.get(column) for column in _FACT_COLUMNS}
+        words = _title_words(row['title'])
+        if len(row['title']) >= 4 and words:
+            node = self._titles
+            for word in words:
+                node = node.setdefault(word, {})
+            node.setdefault(None, set()).add(product_id)
+
+    def _remove(self, product_id):
+        if product_id not in self._documents:
+            return
+        words = _title_words(self._rows[product_id]['title'])
+        path = [self._titles]
+        for word in words:
+            path.append(path[-1].get(word))
+            if path[-1] is None:
+                break
+        else:
+            path[-1].get(None, set()).discard(product_id)
+            # Prune the branch back to the last node still in use
+            for depth in range(len(words), 0, -1):
+                node = path[depth]
+                if node.get(None) == set():
+                    del node[None]
+                if node:
+                    break
+                del path[depth - 1][words[depth - 1]]
+        for term in self._documents.pop(product_id):
+            postings = self._postings[term]
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(product_id)
+        del self._rows[product_id]
+
+    def search(self, query, k=3):
+        """Return (score, product_id) pairs for the top `k` matches, best first"""
+        terms = set(_terms(query))
+        if not terms:
+            return []
+        with self._lock:
+            documents = len(self._rows)
+            if not documents:
+                return []
+            average_length = self._total_length / documents
+            scores = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (documents - len(postings) + 0.5) / (len(postings) + 0.5))
+                for product_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[product_id] / average_length)
+                    scores[product_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        ranked = heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(round(score, 6), product_id) for product_id, score in ranked]
+
+    def mentioned(self, text, limit=3):
+        """Ids of products whose full titles appear in the text, longest title first.
+
+        Titles live in a word trie, so the cost depends on the length of the
+        text and of the titles it walks, not on the size of the catalog.
+        """
+        words = _title_words(text)
+        matches = []
+        with self._lock:
+            for start in range(len(words)):
+                node = self._titles
+                for end in range(start, len(words)):
+                    node = node.get(words[end])
+                    if node is None:
+                        break
+                    for product_id in node.get(None, ()):
+                        matches.append((start - end - 1, start, product_id))
+        found = []
+        used = set()
+        # Longest titles claim their words first, so "The Dark Knight" does not
+        # also match inside "The Dark Knight Rises"
+        for length, start, product_id in sorted(matches):
+            span = set(range(start, start - length))
+            if span & used or product_id in found:
+                continue
+            used |= span
+            found.append(product_id)
+            if len(found) >= limit:
+                break
+        return found
+
+    def facts(self, text, k=3, min_ratio=0.5):
+        """Fact lines for the products most relevant to the text.
+
+        Titles mentioned verbatim come first; the remaining slots go to BM25
+        matches scoring at least `min_ratio` of the best match, so weak
+        single-word overlaps do not crowd the prompt.
+        """
+        ids = self.mentioned(text, k)
+        if len(ids) < k:
+            ranked = self.search(text, k)
+            if ranked:
+                cutoff = ranked[0][0] * min_ratio
+                ids += [pid for score, pid in ranked if score >= cutoff and pid not in ids][:k - len(ids)]
+        with self._lock:
+            return [product_fact(self._rows[pid]) for pid in ids if pid in self._rows]
+
+catalog_retriever = CatalogRetriever()
+
+def _ensure_retriever():
+    """Build the retriever on first use and refresh it when it goes stale.
+
+    Writes from this process are applied incrementally; the periodic rebuild
+    picks up writes made by other worker processes.
+    """
+    ttl = current_app.config.get('CHATBOT_RETRIEVAL_TTL', 300)
+    if catalog_retriever.built_at is not None and time.monotonic() - catalog_retriever.built_at < ttl:
+        return
+    columns = [getattr(Product, name) for name in _INDEX_COLUMNS]
+    rows = db.session.query(*columns).all()
+    catalog_retriever.build(row._asdict() for row in rows)
+    logging.debug(f"Built catalog retriever with {len(catalog_retriever)} products")
+
+def relevant_product_facts(text, k=None):
+    """Compact catalog facts for the products a chat message is about"""
+    _ensure_retriever()
+    return catalog_retriever.facts(text, k or current_app.config['CHATBOT_RETRIEVAL_K'])
+
+@on_products_changed
+def _update_retriever(upserted, deleted_ids):
+    if catalog_retriever.built_at is None:
+        return
+    for row in upserted:
+        catalog_retriever.add(row)
+    for product_id in deleted_ids:
+        catalog_retriever.remove(product_id)
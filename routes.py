@@ -1,9 +1,19 @@
-from flask import render_template, request, redirect, url_for, flash, session, jsonify
+from flask import render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context
 from flask_login import current_user, login_required
 from app import app, db
-from models import Product, CartItem, Order, OrderItem, CategoryType, User
-from auth import bp as auth_bp
-import requests
+from models import Product, CartItem, Order, CategoryType, User, RATING_SORT_KEY
+from auth import bp as auth_bp, stats_token_required
+from search import search_filter, search_page, search_page_ids, iter_products
+from pagination import keyset_paginate
+from catalog_events import on_products_changed
+from cache import LRUCache
+from page_cache import cached_page, cached_fragment, get_page_cache, Deferred
+from http_cache import conditional_page
+from product_cache import get_product_or_404, get_product_cache
+from tags import facet_counts, tag_filter, price_band_filter
+from recommendations import related_products as get_related_products, schedule_order_refresh
+from paypal_client import get_paypal_client, PayPalAuthError, PayPalUnavailableError
+from cart_service import get_cart_summary, refresh_cart_summary, load_cart_items, create_order_from_cart, attach_paypal_order, mark_order_failed
 import json
 import uuid
 from datetime import datetime
@@ -11,19 +21,88 @@ import logging
 
 # Authentication blueprint is registered in app.py
 
+app.add_template_global(cached_fragment)
+
+def featured_products(category):
+    """First products of a category, loaded only if the template renders them"""
+    return Deferred(lambda: Product.query.filter_by(category=category).limit(4).all())
+
 @app.route('/')
+@conditional_page
+@cached_page
 def index():
     """Home page with featured products from all categories"""
-    movies = Product.query.filter_by(category=CategoryType.MOVIE).limit(4).all()
-    software = Product.query.filter_by(category=CategoryType.SOFTWARE).limit(4).all()
-    games = Product.query.filter_by(category=CategoryType.GAME).limit(4).all()
+    movies = featured_products(CategoryType.MOVIE)
+    software = featured_products(CategoryType.SOFTWARE)
+    games = featured_products(CategoryType.GAME)
     
     return render_template('index.html', 
                          movies=movies, 
                          software=software, 
                          games=games)
 
+# (expression, descending) sort keys for each category listing order. Each ends
+# in Product.id so the order is total, and each matches a composite index.
+CATEGORY_SORTS = {
+    'title': [(Product.title, False), (Product.id, False)],
+    'price_low': [(Product.price, False), (Product.id, False)],
+    'price_high': [(Product.price, True), (Product.id, True)],
+    'rating': [(RATING_SORT_KEY, True), (Product.id, True)],
+}
+
+category_counts = LRUCache(maxsize=256, ttl=app.config['CATEGORY_COUNT_TTL'])
+category_facets = LRUCache(maxsize=256, ttl=app.config['CATEGORY_COUNT_TTL'])
+
+@on_products_changed
+def _reset_category_counts(upserted, deleted_ids):
+    category_counts.clear()
+    category_facets.clear()
+
+def category_base_filters(category_enum, search=''):
+    """SQL clauses for a category listing before any facet is selected"""
+    clauses = [Product.category == category_enum]
+    if search:
+        clauses.append(search_filter(search))
+    return clauses
+
+def category_facet_filters(genres=(), platforms=(), price=None):
+    """{facet: SQL clause} for the facet values a visitor selected"""
+    filters = {}
+    if genres:
+        filters['genre'] = tag_filter('genre', genres)
+    if platforms:
+        filters['platform'] = tag_filter('platform', platforms)
+    if price:
+        filters['price'] = price_band_filter(price)
+    return filters
+
+def category_filters(category_enum, search='', genres=(), platforms=(), price=None):
+    """SQL clauses for a category listing with its search and facet filters"""
+    return [*category_base_filters(category_enum, search),
+            *category_facet_filters(genres, platforms, price).values()]
+
+def get_category_count(category_enum, search='', genres=(), platforms=(), price=None):
+    """Total products in a category listing, cached apart from the page query"""
+    key = (category_enum.value, search, genres, platforms, price)
+    total = category_counts.get(key)
+    if total is None:
+        clauses = category_filters(category_enum, search, genres, platforms, price)
+        total = Product.query.filter(*clauses).count()
+        category_counts.set(key, total)
+    return total
+
+def get_category_facets(category_enum, search='', genres=(), platforms=(), price=None):
+    """Genre, platform and price band counts for a category listing, cached"""
+    key = (category_enum.value, search, genres, platforms, price)
+    facets = category_facets.get(key)
+    if facets is None:
+        facets = facet_counts(category_base_filters(category_enum, search),
+                              category_facet_filters(genres, platforms, price))
+        category_facets.set(key, facets)
+    return facets
+
 @app.route('/category/<category>')
+@conditional_page
 def category_page(category):
     """Category page showing all products in a specific category"""
     try:
@@ -32,42 +111,48 @@ def category_page(category):
         flash('Invalid category', 'error')
         return redirect(url_for('index'))
     
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     search = request.args.get('search', '')
     sort_by = request.args.get('sort', 'title')
+    if sort_by not in CATEGORY_SORTS:
+        sort_by = 'title'
     
-    query = Product.query.filter_by(category=category_enum)
+    # Facet filters: any of the chosen genres, any of the chosen platforms, one price band
+    genres = tuple(sorted(set(request.args.getlist('genre'))))
+    platforms = tuple(sorted(set(request.args.getlist('platform'))))
+    price = request.args.get('price')
+    if price_band_filter(price) is None:
+        price = None
     
-    if search:
-        query = query.filter(Product.title.ilike(f'%{search}%'))
-    
-    # Sorting
-    if sort_by == 'price_low':
-        query = query.order_by(Product.price)
-    elif sort_by == 'price_high':
-        query = query.order_by(Product.price.desc())
-    elif sort_by == 'rating':
-        query = query.order_by(Product.rating.desc())
-    else:
-        query = query.order_by(Product.title)
+    query = Product.query.filter(*category_filters(category_enum, search, genres, platforms, price))
     
-    products = query.paginate(page=page, per_page=12, error_out=False)
+    try:
+        products = keyset_paginate(query, CATEGORY_SORTS[sort_by], cursor=cursor, per_page=12)
+    except ValueError:
+        return redirect(url_for('category_page', category=category, search=search, sort=sort_by,
+                                genre=list(genres), platform=list(platforms), price=price))
+    products.total = get_category_count(category_enum, search, genres, platforms, price)
+    facets = get_category_facets(category_enum, search, genres, platforms, price)
     
     return render_template('category.html', 
                          products=products, 
                          category=category,
                          search=search,
-                         sort_by=sort_by)
+                         sort_by=sort_by,
+                         facets=facets,
+                         selected_genres=genres,
+                         selected_platforms=platforms,
+                         selected_price=price)
 
 @app.route('/product/<int:product_id>')
+@conditional_page
+@cached_page
 def product_detail(product_id):
     """Product detail page"""
-    product = Product.query.get_or_404(product_id)
+    product = get_product_or_404(product_id)
     
-    # Get related products from the same category
-    related_products = Product.query.filter_by(category=product.category)\
-                                   .filter(Product.id != product_id)\
-                                   .limit(4).all()
+    # Precomputed neighbours by shared credits, genres, platforms and co-purchases
+    related_products = get_related_products(product)
     
     return render_template('product_detail.html', 
                          product=product, 
@@ -77,7 +162,7 @@ def product_detail(product_id):
 def add_to_cart(product_id):
     """Add product to cart"""
     try:
-        product = Product.query.get_or_404(product_id)
+        product = get_product_or_404(product_id)
         
         # Initialize session if needed
         if 'cart_session_id' not in session:
@@ -101,6 +186,7 @@ def add_to_cart(product_id):
             logging.debug(f"Created new cart item")
         
         db.session.commit()
+        refresh_cart_summary()
         flash(f'{product.title} added to cart!', 'success')
         
         return redirect(request.referrer or url_for('index'))
@@ -112,15 +198,13 @@ def add_to_cart(product_id):
 @app.route('/cart')
 def cart():
     """Shopping cart page"""
-    if 'cart_session_id' not in session:
+    summary = refresh_cart_summary()
+    if not summary['count']:
         cart_items = []
-        total = 0
     else:
-        session_id = session['cart_session_id']
-        cart_items = CartItem.query.filter_by(session_id=session_id).all()
-        total = sum(item.product.price * item.quantity for item in cart_items)
+        cart_items = load_cart_items(session['cart_session_id'])
     
-    return render_template('cart.html', cart_items=cart_items, total=total)
+    return render_template('cart.html', cart_items=cart_items, total=summary['total'])
 
 @app.route('/update_cart/<int:item_id>', methods=['POST'])
 def update_cart(item_id):
@@ -143,6 +227,7 @@ def update_cart(item_id):
         db.session.commit()
         flash('Item removed from cart!', 'success')
     
+    refresh_cart_summary()
     return redirect(url_for('cart'))
 
 @app.route('/remove_from_cart/<int:item_id>', methods=['POST'])
@@ -157,6 +242,7 @@ def remove_from_cart(item_id):
     
     db.session.delete(cart_item)
     db.session.commit()
+    refresh_cart_summary()
     flash('Item removed from cart!', 'success')
     
     return redirect(url_for('cart'))
@@ -168,18 +254,17 @@ def checkout():
         flash('Your cart is empty', 'error')
         return redirect(url_for('cart'))
     
-    session_id = session['cart_session_id']
-    cart_items = CartItem.query.filter_by(session_id=session_id).all()
+    summary = refresh_cart_summary()
     
-    if not cart_items:
+    if not summary['count']:
         flash('Your cart is empty', 'error')
         return redirect(url_for('cart'))
     
-    total = sum(item.product.price * item.quantity for item in cart_items)
+    cart_items = load_cart_items(session['cart_session_id'])
     
     return render_template('checkout.html', 
                          cart_items=cart_items, 
-                         total=total,
+                         total=summary['total'],
                          paypal_client_id=app.config['PAYPAL_CLIENT_ID'])
 
 @app.route('/create_paypal_order', methods=['POST'])
@@ -190,37 +275,20 @@ def create_paypal_order():
             return jsonify({'error': 'No cart found'}), 400
         
         session_id = session['cart_session_id']
-        cart_items = CartItem.query.filter_by(session_id=session_id).all()
+        order_number = f"ORD-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
         
-        if not cart_items:
+        # Snapshot the cart into the order first and charge the total of the
+        # stored lines, so a concurrent cart change cannot split the two
+        created = create_order_from_cart(session_id, order_number)
+        if created is None:
             return jsonify({'error': 'Cart is empty'}), 400
-        
-        total = sum(item.product.price * item.quantity for item in cart_items)
-        
-        # PayPal API endpoint
-        paypal_url = "https://api.sandbox.paypal.com"
-        
-        # Get access token
-        auth_response = requests.post(
-            f"{paypal_url}/v1/oauth2/token",
-            headers={
-                "Accept": "application/json",
-                "Accept-Language": "en_US",
-            },
-            data="grant_type=client_credentials",
-            auth=(app.config['PAYPAL_CLIENT_ID'], app.config['PAYPAL_CLIENT_SECRET'])
-        )
-        
-        if auth_response.status_code != 200:
-            logging.error(f"PayPal auth failed: {auth_response.text}")
-            return jsonify({'error': 'PayPal authentication failed'}), 500
-        
-        access_token = auth_response.json()['access_token']
+        order_id, total = created
         
         # Create order
         order_data = {
             "intent": "CAPTURE",
             "purchase_units": [{
+                "reference_id": order_number,
                 "amount": {
                     "currency_code": "USD",
                     "value": f"{total:.2f}"
@@ -233,45 +301,24 @@ def create_paypal_order():
             }
         }
         
-        order_response = requests.post(
-            f"{paypal_url}/v2/checkout/orders",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {access_token}",
-            },
-            json=order_data
-        )
+        try:
+            order_response = get_paypal_client().create_order(order_data, request_id=order_number)
+        except PayPalAuthError:
+            mark_order_failed(order_id)
+            return jsonify({'error': 'PayPal authentication failed'}), 500
+        except PayPalUnavailableError:
+            mark_order_failed(order_id)
+            return jsonify({'error': 'Payment service temporarily unavailable'}), 503
         
         if order_response.status_code != 201:
             logging.error(f"PayPal order creation failed: {order_response.text}")
+            mark_order_failed(order_id)
             return jsonify({'error': 'Failed to create PayPal order'}), 500
         
         order_result = order_response.json()
         
-        # Store order in database
-        order_number = f"ORD-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
-        
-        order = Order(
-            order_number=order_number,
-            session_id=session_id,
-            total_amount=total,
-            paypal_order_id=order_result['id'],
-            status='pending'
-        )
-        db.session.add(order)
-        db.session.commit()
-        
-        # Store order items
-        for cart_item in cart_items:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=cart_item.product_id,
-                quantity=cart_item.quantity,
-                price=cart_item.product.price
-            )
-            db.session.add(order_item)
-        
-        db.session.commit()
+        # Link the stored order to PayPal's so capture can find it
+        attach_paypal_order(order_id, order_result['id'])
         
         return jsonify({
             'order_id': order_result['id'],
@@ -297,33 +344,13 @@ def capture_paypal_order():
         if not order:
             return jsonify({'error': 'Order not found'}), 404
         
-        # PayPal API endpoint
-        paypal_url = "https://api.sandbox.paypal.com"
-        
-        # Get access token
-        auth_response = requests.post(
-            f"{paypal_url}/v1/oauth2/token",
-            headers={
-                "Accept": "application/json",
-                "Accept-Language": "en_US",
-            },
-            data="grant_type=client_credentials",
-            auth=(app.config['PAYPAL_CLIENT_ID'], app.config['PAYPAL_CLIENT_SECRET'])
-        )
-        
-        if auth_response.status_code != 200:
-            return jsonify({'error': 'PayPal authentication failed'}), 500
-        
-        access_token = auth_response.json()['access_token']
-        
         # Capture order
-        capture_response = requests.post(
-            f"{paypal_url}/v2/checkout/orders/{order_id}/capture",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {access_token}",
-            }
-        )
+        try:
+            capture_response = get_paypal_client().capture_order(order_id)
+        except PayPalAuthError:
+            return jsonify({'error': 'PayPal authentication failed'}), 500
+        except PayPalUnavailableError:
+            return jsonify({'error': 'Payment service temporarily unavailable'}), 503
         
         if capture_response.status_code != 201:
             logging.error(f"PayPal capture failed: {capture_response.text}")
@@ -333,10 +360,15 @@ def capture_paypal_order():
         order.status = 'completed'
         db.session.commit()
         
+        # Co-purchase counts changed for every product in this order
+        if app.config['RECOMMENDATIONS_AUTO_REFRESH']:
+            schedule_order_refresh([item.product_id for item in order.items])
+        
         # Clear cart
         if 'cart_session_id' in session:
             CartItem.query.filter_by(session_id=session['cart_session_id']).delete()
             db.session.commit()
+        refresh_cart_summary()
         
         return jsonify({
             'success': True,
@@ -347,49 +379,94 @@ def capture_paypal_order():
         logging.error(f"Error capturing PayPal order: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@app.route('/page-cache/stats')
+@stats_token_required
+def page_cache_stats():
+    return jsonify(get_page_cache().stats())
+
+@app.route('/product-cache/stats')
+@stats_token_required
+def product_cache_stats():
+    return jsonify(get_product_cache().stats())
+
+@app.route('/paypal/metrics')
+@stats_token_required
+def paypal_metrics():
+    """Outbound PayPal call counters and circuit breaker state for this worker"""
+    return jsonify(get_paypal_client().metrics())
+
 @app.route('/checkout/success')
 def checkout_success():
     """Checkout success page"""
     order_number = request.args.get('order_number')
     return render_template('checkout_success.html', order_number=order_number)
 
+def _search_page_size():
+    """Requested page size for search results, clamped to the configured maximum"""
+    per_page = request.args.get('per_page', app.config['SEARCH_PAGE_SIZE'], type=int)
+    return max(1, min(per_page, app.config['SEARCH_MAX_PAGE_SIZE']))
+
+def _search_category():
+    category = request.args.get('category', '')
+    try:
+        return CategoryType(category).value if category else None
+    except ValueError:
+        return None
+
 @app.route('/search')
 def search():
     """Search products across all categories"""
     query = request.args.get('q', '')
-    category = request.args.get('category', '')
     
     if not query:
         flash('Please enter a search term', 'error')
         return redirect(url_for('index'))
     
-    search_query = Product.query.filter(Product.title.ilike(f'%{query}%'))
-    
-    if category:
-        try:
-            category_enum = CategoryType(category)
-            search_query = search_query.filter_by(category=category_enum)
-        except ValueError:
-            pass
-    
-    products = search_query.all()
+    try:
+        products = search_page(query, _search_category(),
+                               cursor=request.args.get('cursor'),
+                               per_page=_search_page_size())
+    except ValueError:
+        return redirect(url_for('search', q=query, category=request.args.get('category', '')))
     
     return render_template('category.html', 
-                         products=type('obj', (object,), {'items': products, 'pages': 1, 'page': 1}),
+                         products=products,
                          category='search',
                          search=query)
 
+@app.route('/search.json')
+def search_json():
+    """Search products and stream one page of results as JSON"""
+    query = request.args.get('q', '')
+    
+    if not query:
+        return jsonify({'error': 'Search term required'}), 400
+    
+    try:
+        ids, next_cursor = search_page_ids(query, _search_category(),
+                                           cursor=request.args.get('cursor'),
+                                           per_page=_search_page_size())
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    def generate():
+        yield '{"products": ['
+        for index, product in enumerate(iter_products(ids)):
+            yield (',' if index else '') + json.dumps(product.to_dict())
+        yield '], "next_cursor": ' + json.dumps(next_cursor) + '}'
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
 @app.context_processor
 def utility_processor():
     """Add utility functions to template context"""
     def get_cart_count():
-        if 'cart_session_id' not in session:
-            return 0
-        
-        session_id = session['cart_session_id']
-        return CartItem.query.filter_by(session_id=session_id).count()
+        return get_cart_summary()['count']
+    
+    def get_cart_total():
+        return get_cart_summary()['total']
     
-    return dict(get_cart_count=get_cart_count)
+    return dict(get_cart_count=get_cart_count, get_cart_total=get_cart_total)
 
 @app.errorhandler(404)
 def not_found_error(error):
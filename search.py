@@ -0,0 +1,244 @@
+from collections import defaultdict
+from decimal import Decimal
+from sqlalchemy import DDL, Numeric, and_, cast, event, false, func, literal_column, or_, select
+from flask import current_app
+from app import db
+from models import Product, CategoryType
+from catalog_events import on_products_changed
+from pagination import KeysetPage, decode_cursor, encode_cursor
+import logging
+import re
+import threading
+import time
+
+# Weighted document used by PostgreSQL full-text search. The GIN index below is
+# built on exactly this expression so the planner can use it for @@ matches.
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(genre, '') || ' ' || coalesce(director, '') || ' ' || coalesce(developer, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+
+SEARCH_INDEX_SQL = f"CREATE INDEX IF NOT EXISTS ix_product_search ON product USING gin (({SEARCH_VECTOR_SQL}))"
+
+event.listen(Product.__table__, 'after_create', DDL(SEARCH_INDEX_SQL).execute_if(dialect='postgresql'))
+
+# Relative weight of a match in each field for the in-process index
+FIELD_WEIGHTS = {
+    'title': 1.0,
+    'genre': 0.4,
+    'director': 0.4,
+    'developer': 0.4,
+    'description': 0.1,
+}
+
+_TOKEN_RE = re.compile(r'\w+')
+
+def tokenize(text):
+    """Split text into lowercase word tokens"""
+    return _TOKEN_RE.findall(text.lower()) if text else []
+
+def _trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+class ProductSearchIndex:
+    """In-process inverted index over the product catalog.
+
+    Used when the database has no full-text support (SQLite in development).
+    Query terms are matched as substrings of indexed tokens, found through a
+    trigram index over the vocabulary, so behaviour mirrors the old ILIKE search.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)    # token -> {product_id: weight}
+        self._trigrams = defaultdict(set)     # trigram -> tokens
+        self._documents = {}                  # product_id -> set of tokens
+        self._categories = {}                 # product_id -> category value
+        self.built_at = None
+
+    def build(self, rows):
+        """Replace the index contents with the given product rows"""
+        with self._lock:
+            self._postings.clear()
+            self._trigrams.clear()
+            self._documents.clear()
+            self._categories.clear()
+            for row in rows:
+                self._add(row)
+            self.built_at = time.monotonic()
+
+    def add(self, row):
+        """Index or re-index a single product"""
+        with self._lock:
+            self._remove(row['id'])
+            self._add(row)
+
+    def remove(self, product_id):
+        """Drop a product from the index"""
+        with self._lock:
+            self._remove(product_id)
+
+    def __len__(self):
+        return len(self._documents)
+
+    def _add(self, row):
+        product_id = row['id']
+        weights = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(row.get(field)):
+                weights[token] += weight
+        for token, weight in weights.items():
+            if token not in self._postings:
+                for trigram in _trigrams(token):
+                    self._trigrams[trigram].add(token)
+            self._postings[token][product_id] = weight
+        self._documents[product_id] = set(weights)
+        category = row.get('category')
+        self._categories[product_id] = category.value if isinstance(category, CategoryType) else category
+
+    def _remove(self, product_id):
+        for token in self._documents.pop(product_id, ()):
+            postings = self._postings[token]
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[token]
+                for trigram in _trigrams(token):
+                    self._trigrams[trigram].discard(token)
+        self._categories.pop(product_id, None)
+
+    def _matching_tokens(self, term):
+        if len(term) < 3:
+            return [token for token in self._postings if term in token]
+        candidates = None
+        for trigram in _trigrams(term):
+            tokens = self._trigrams.get(trigram, set())
+            candidates = tokens if candidates is None else candidates & tokens
+            if not candidates:
+                return []
+        return [token for token in candidates if term in token]
+
+    def search(self, query, category=None):
+        """Return (score, product_id) pairs matching every query term, best first"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            scores = None
+            for term in terms:
+                term_scores = defaultdict(float)
+                for token in self._matching_tokens(term):
+                    # Whole-token matches rank above substring matches
+                    boost = 1.0 if token == term else 0.5
+                    for product_id, weight in self._postings[token].items():
+                        term_scores[product_id] += weight * boost
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {pid: score + term_scores[pid] for pid, score in scores.items() if pid in term_scores}
+                if not scores:
+                    return []
+            if category:
+                scores = {pid: score for pid, score in scores.items() if self._categories.get(pid) == category}
+        return sorted(((round(score, 6), pid) for pid, score in scores.items()), key=lambda item: (-item[0], item[1]))
+
+search_index = ProductSearchIndex()
+
+_INDEX_COLUMNS = ['id', 'category', *FIELD_WEIGHTS]
+
+def _use_fulltext():
+    return db.engine.dialect.name == 'postgresql'
+
+def _ensure_index():
+    """Build the in-process index on first use and refresh it when it goes stale"""
+    ttl = current_app.config.get('SEARCH_INDEX_TTL', 300)
+    if search_index.built_at is not None and time.monotonic() - search_index.built_at < ttl:
+        return
+    columns = [getattr(Product, name) for name in _INDEX_COLUMNS]
+    rows = db.session.query(*columns).all()
+    search_index.build(row._asdict() for row in rows)
+    logging.debug(f"Built product search index with {len(search_index)} products")
+
+def _tsquery(query):
+    """Prefix-matching tsquery for the given terms; tokens are \\w+ so they are safe to inline"""
+    return func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in tokenize(query)))
+
+def ranked_product_ids(query, category=None, limit=None, after=None):
+    """Return (rank, product_id) pairs for a search, best match first.
+
+    `after` is the (rank, product_id) of the last row already seen; only rows
+    that sort after it are returned, so pages are seeks rather than offsets.
+    """
+    if not tokenize(query):
+        return []
+    if _use_fulltext():
+        vector = literal_column(SEARCH_VECTOR_SQL)
+        tsquery = _tsquery(query)
+        # ts_rank is a real; rounded to numeric it compares exactly with the
+        # cursor's float after the JSON round trip, as the in-process scores do
+        rank = func.round(cast(func.ts_rank(vector, tsquery), Numeric), 6)
+        ranked = db.session.query(rank.label('rank'), Product.id).filter(vector.op('@@')(tsquery))
+        if category:
+            ranked = ranked.filter(Product.category == CategoryType(category))
+        if after:
+            last_rank, last_id = after
+            last_rank = Decimal(repr(last_rank))
+            ranked = ranked.filter(or_(rank < last_rank, and_(rank == last_rank, Product.id > last_id)))
+        ranked = ranked.order_by(rank.desc(), Product.id)
+        if limit:
+            ranked = ranked.limit(limit)
+        return [(float(row.rank), row.id) for row in ranked]
+    _ensure_index()
+    results = search_index.search(query, category)
+    if after:
+        last_rank, last_id = after
+        results = [(score, pid) for score, pid in results if (-score, pid) > (-last_rank, last_id)]
+    return results[:limit] if limit else results
+
+def search_filter(query):
+    """SQL clause restricting a Product query to search matches"""
+    if not tokenize(query):
+        return false()
+    if _use_fulltext():
+        return literal_column(SEARCH_VECTOR_SQL).op('@@')(_tsquery(query))
+    # Same matching as the in-process index: every term is a substring of a
+    # token in one of the indexed fields. Terms are \w+, so a substring of the
+    # field text never spans two tokens.
+    columns = [getattr(Product, field) for field in FIELD_WEIGHTS]
+    matches = select(Product.id).where(and_(*(
+        or_(*(func.lower(column).contains(term, autoescape=True) for column in columns))
+        for term in tokenize(query)
+    )))
+    return Product.id.in_(matches.scalar_subquery())
+
+def _fetch_in_order(ids):
+    products = {product.id: product for product in Product.query.filter(Product.id.in_(ids))}
+    return [products[product_id] for product_id in ids if product_id in products]
+
+def search_page_ids(query, category=None, cursor=None, per_page=24):
+    """Return the ranked ids for one page of results and the cursor for the next page"""
+    after = decode_cursor(cursor)
+    if after is not None and (len(after) != 2 or not all(isinstance(value, (int, float)) for value in after)):
+        raise ValueError('Invalid cursor')
+    ranked = ranked_product_ids(query, category, limit=per_page + 1, after=after)
+    next_cursor = encode_cursor(ranked[per_page - 1]) if len(ranked) > per_page else None
+    return [product_id for _, product_id in ranked[:per_page]], next_cursor
+
+def search_page(query, category=None, cursor=None, per_page=24):
+    """Return one KeysetPage of matching products ordered by relevance"""
+    ids, next_cursor = search_page_ids(query, category, cursor, per_page)
+    return KeysetPage(_fetch_in_order(ids), next_cursor=next_cursor, cursor=cursor, per_page=per_page)
+
+def iter_products(ids, batch_size=50):
+    """Yield products for the given ids in order, loading them in batches"""
+    for start in range(0, len(ids), batch_size):
+        yield from _fetch_in_order(ids[start:start + batch_size])
+
+@on_products_changed
+def _update_search_index(upserted, deleted_ids):
+    if search_index.built_at is None:
+        return
+    for row in upserted:
+        search_index.add(row)
+    for product_id in deleted_ids:
+        search_index.remove(product_id)
@@ -0,0 +1,117 @@
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from app import db
+from models import ChatSentiment
+import logging
+import re
+import threading
+
+POSITIVE_WORDS = {
+    'thanks', 'thank', 'great', 'awesome', 'love', 'perfect', 'excellent', 'amazing',
+    'good', 'nice', 'happy', 'helpful', 'appreciate', 'wonderful', 'fantastic', 'works',
+}
+NEGATIVE_WORDS = {
+    'bad', 'terrible', 'awful', 'hate', 'angry', 'annoyed', 'frustrated', 'broken',
+    'worst', 'useless', 'disappointed', 'wrong', 'problem', 'issue', 'error', 'fail',
+    'failed', 'scam', 'ridiculous', 'unacceptable', 'never', 'not', "doesn't", "can't",
+    "won't", 'cannot',
+}
+URGENT_PATTERNS = re.compile(
+    r"\b(urgent|asap|immediately|right now|charged twice|double charged|fraud|scam|"
+    r"stolen|hacked|refund now|chargeback|lawyer)\b"
+)
+_WORD_RE = re.compile(r"[a-z']+")
+
+# Messages longer than this with a weak signal are sent to the LLM
+LONG_MESSAGE_WORDS = 40
+
+def heuristic_sentiment(message):
+    """Score a message with a keyword lexicon.
+
+    Returns (result, ambiguous); ambiguous results should be confirmed by the
+    LLM. Mixed positive and negative signals, or long messages with only a
+    weak signal, count as ambiguous.
+    """
+    text = message.lower()
+    words = _WORD_RE.findall(text)
+    positive = sum(1 for word in words if word in POSITIVE_WORDS)
+    negative = sum(1 for word in words if word in NEGATIVE_WORDS)
+    urgent = URGENT_PATTERNS.search(text) is not None or text.count('!') >= 3
+
+    score = positive - negative
+    rating = 3 + max(-2, min(2, score))
+    if score > 0:
+        emotion = 'satisfied'
+    elif score < 0:
+        emotion = 'frustrated'
+    else:
+        emotion = 'neutral'
+
+    signal = positive + negative
+    ambiguous = (positive and negative) or (len(words) > LONG_MESSAGE_WORDS and abs(score) < 2)
+    confidence = 0.5 if ambiguous else min(0.9, 0.6 + 0.1 * signal)
+
+    return {
+        'rating': rating,
+        'confidence': confidence,
+        'urgent': urgent,
+        'emotion': emotion,
+    }, bool(ambiguous)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=current_app.config['CHATBOT_SENTIMENT_WORKERS'],
+                    thread_name_prefix='sentiment'
+                )
+    return _executor
+
+def _score_and_store(app, chatbot, conversation_id, message, result, ambiguous):
+    with app.app_context():
+        source = 'heuristic'
+        if ambiguous:
+            verdict = chatbot.analyze_sentiment(message)
+            if verdict is not None:
+                result, source = verdict, 'llm'
+            else:
+                # Keep the heuristic score, including its urgency flag, and
+                # mark the row so the missed confirmation shows up
+                source = 'llm_failed'
+                logging.warning(f"Kept heuristic sentiment for {conversation_id}: LLM scoring failed")
+        try:
+            db.session.add(ChatSentiment(
+                conversation_id=conversation_id,
+                message=message,
+                rating=result['rating'],
+                confidence=result['confidence'],
+                urgent=result['urgent'],
+                emotion=result['emotion'],
+                source=source
+            ))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Storing sentiment failed: {e}")
+
+def submit_sentiment(chatbot, conversation_id, message):
+    """Score a message in the background and store it against the conversation.
+
+    Returns the heuristic result straight away for callers that want an
+    immediate estimate; the stored result may be refined by the LLM.
+    """
+    result, ambiguous = heuristic_sentiment(message)
+    app = current_app._get_current_object()
+    _get_executor().submit(_score_and_store, app, chatbot, conversation_id, message, result, ambiguous)
+    return result
+
+def get_conversation_sentiment(conversation_id):
+    """Stored sentiment results for a conversation, oldest first"""
+    rows = ChatSentiment.query.filter_by(conversation_id=conversation_id)\
+                              .order_by(ChatSentiment.id).all()
+    return [row.to_dict() for row in rows]
@@ -0,0 +1,193 @@
+from collections import Counter, defaultdict, namedtuple
+import logging
+import random
+import time
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # the pure-Python scorer in recommendations is used instead
+    np = None
+    sparse = None
+    logging.warning("NumPy/SciPy not installed; related products use the slower pure-Python scorer")
+
+# Scores are ranked and stored to six decimal places
+SCORE_SCALE = 1_000_000
+
+def available():
+    """True when NumPy and SciPy are installed"""
+    return np is not None
+
+class _CategoryMatrix:
+    """Feature matrices for the products of one category.
+
+    Frequent features (genres, platforms) sit in a small dense matrix so
+    their overlaps come from one BLAS matrix product. Rare features
+    (directors, developers) stay sparse, where the product is cheap because
+    each one is shared by few products.
+    """
+
+    def __init__(self, ids, features, max_dense=128):
+        self.ids = np.array(ids, dtype=np.int64)
+        self.positions = {product_id: position for position, product_id in enumerate(ids)}
+        frequency = Counter(feature for product_id in ids for feature in features[product_id])
+        threshold = max(2, int(len(ids) ** 0.5))
+        dense = [feature for feature, count in frequency.most_common(max_dense) if count > threshold]
+        dense_columns = {feature: column for column, feature in enumerate(dense)}
+        sparse_columns = {}
+
+        self.dense_weights = np.zeros((len(ids), max(1, len(dense))), dtype=np.float64)
+        indptr, indices, data = [0], [], []
+        for row, product_id in enumerate(ids):
+            for feature, weight in features[product_id].items():
+                column = dense_columns.get(feature)
+                if column is not None:
+                    self.dense_weights[row, column] = weight
+                else:
+                    indices.append(sparse_columns.setdefault(feature, len(sparse_columns)))
+                    data.append(weight)
+            indptr.append(len(indices))
+        self.dense_indicators_t = (self.dense_weights > 0).astype(np.float64).T.copy()
+        self.sparse_weights = sparse.csr_matrix(
+            (np.array(data, dtype=np.float64), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+            shape=(len(ids), max(1, len(sparse_columns)))
+        )
+        indicators = self.sparse_weights.copy()
+        indicators.data[:] = 1
+        self.sparse_indicators_t = indicators.T.tocsr()
+        self.totals = self.dense_weights.sum(axis=1) + np.asarray(self.sparse_weights.sum(axis=1), dtype=np.float64).ravel()
+
+    def scores(self, rows):
+        """Weighted Jaccard similarity of the given rows against every product in the category"""
+        overlap = self.dense_weights[rows] @ self.dense_indicators_t
+        if self.sparse_weights.nnz:
+            shared = (self.sparse_weights[rows] @ self.sparse_indicators_t).tocoo()
+            overlap[shared.row, shared.col] += shared.data
+        union = self.totals[rows, None] + self.totals[None, :] - overlap
+        return np.divide(overlap, union, out=np.zeros_like(overlap), where=overlap > 0)
+
+class SimilarityMatrix:
+    """Vectorised all-pairs scoring for a CatalogFeatures snapshot.
+
+    Gives the same scores as CatalogFeatures.similar plus co-purchases, but
+    scores a block of products against its whole category with matrix
+    products instead of walking postings one product at a time. Content
+    similarity only counts within a category, so each category is scored
+    separately. Blocks are sized so the dense intermediates stay within
+    `memory_mb` whatever the catalog size.
+    """
+
+    def __init__(self, catalog, memory_mb=64):
+        self.memory_mb = memory_mb
+        by_category = defaultdict(list)
+        for product_id in sorted(catalog.categories):
+            by_category[catalog.categories[product_id]].append(product_id)
+        self.categories = catalog.categories
+        self.groups = {category: _CategoryMatrix(ids, catalog.features) for category, ids in by_category.items()}
+
+    def _block_rows(self, group):
+        # About five 8-byte arrays as wide as the category are alive per scored row
+        return max(1, (self.memory_mb * 1024 * 1024) // (len(group.ids) * 8 * 5))
+
+    def top_neighbors(self, product_ids, limit, co_purchases=None, co_purchase_weight=0.75):
+        """{product id: [(neighbour id, score), ...]} best first, positive scores only"""
+        co_purchases = co_purchases or {}
+        requested = defaultdict(list)
+        for product_id in product_ids:
+            if product_id in self.categories:
+                requested[self.categories[product_id]].append(product_id)
+
+        neighbors = {}
+        for category, ids in requested.items():
+            group = self.groups[category]
+            rows = np.array([group.positions[product_id] for product_id in ids], dtype=np.int64)
+            k = min(limit, len(group.ids) - 1)
+            block_size = self._block_rows(group)
+            for start in range(0, len(rows), block_size):
+                block = rows[start:start + block_size]
+                scores = group.scores(block) if k > 0 else None
+                bonuses = []
+                for offset, row in enumerate(block):
+                    bought = co_purchases.get(int(group.ids[row]), {})
+                    most = max(bought.values(), default=0)
+                    other_category = []
+                    for other, orders in bought.items():
+                        bonus = co_purchase_weight * orders / most
+                        column = group.positions.get(other)
+                        if column is not None:
+                            scores[offset, column] += bonus
+                        else:
+                            other_category.append((other, bonus))
+                    bonuses.append(other_category)
+
+                if k > 0:
+                    scores[np.arange(len(block)), block] = 0
+                    # Rank on whole millionths so float noise cannot reorder equal
+                    # scores; ties go to the lower product id, as in the Python scorer
+                    units = np.rint(scores * SCORE_SCALE).astype(np.int64)
+                    width = len(group.ids)
+                    keys = units * width + (width - 1 - np.arange(width))
+                    top = np.argpartition(-keys, k - 1, axis=1)[:, :k]
+                    order = np.argsort(-np.take_along_axis(keys, top, axis=1), axis=1)
+                    top = np.take_along_axis(top, order, axis=1)
+                    top_units = np.take_along_axis(units, top, axis=1)
+
+                for offset, row in enumerate(block):
+                    ranked = []
+                    if k > 0:
+                        ranked = [(int(group.ids[column]), int(unit) / SCORE_SCALE)
+                                  for column, unit in zip(top[offset], top_units[offset]) if unit > 0]
+                    if bonuses[offset]:
+                        ranked = sorted(ranked + bonuses[offset], key=lambda item: (-round(item[1], 6), item[0]))[:limit]
+                    neighbors[int(group.ids[row])] = ranked
+        return neighbors
+
+SyntheticProduct = namedtuple('SyntheticProduct', 'id category rating genre platform director developer')
+
+GENRES = ['Action', 'Adventure', 'Comedy', 'Drama', 'Sci-Fi', 'Thriller', 'Horror', 'RPG', 'Strategy',
+          'Puzzle', 'Productivity', 'Design', 'Development', 'Security', 'Education', 'Music']
+PLATFORMS = ['PC', 'Mac', 'Linux', 'PlayStation', 'Xbox', 'Switch', 'iOS', 'Android', 'Web']
+
+def synthetic_catalog(size, seed=0):
+    """Catalog rows with realistic field shapes for benchmarking"""
+    rng = random.Random(seed)
+    people = max(10, size // 20)
+    rows = []
+    for product_id in range(1, size + 1):
+        category = rng.choice(['movie', 'software', 'game'])
+        rows.append(SyntheticProduct(
+            id=product_id,
+            category=category,
+            rating=round(rng.uniform(1, 10), 1),
+            genre=', '.join(rng.sample(GENRES, rng.randint(1, 3))),
+            platform=', '.join(rng.sample(PLATFORMS, rng.randint(1, 4))) if category != 'movie' else None,
+            director=f'Director {rng.randrange(people)}' if category == 'movie' else None,
+            developer=f'Studio {rng.randrange(people)}' if category != 'movie' else None,
+        ))
+    return rows
+
+def benchmark(sizes, limit=8, python_max=20000, memory_mb=64):
+    """Time content scoring for every product at each catalog size.
+
+    Returns (size, vectorised seconds, pure-Python seconds or None) tuples;
+    the pure-Python scorer is skipped above `python_max` products.
+    """
+    from recommendations import CatalogFeatures
+    results = []
+    for size in sizes:
+        catalog = CatalogFeatures(synthetic_catalog(size))
+        ids = sorted(catalog.categories)
+
+        started = time.perf_counter()
+        SimilarityMatrix(catalog, memory_mb=memory_mb).top_neighbors(ids, limit)
+        vectorised = time.perf_counter() - started
+
+        python = None
+        if size <= python_max:
+            started = time.perf_counter()
+            for product_id in ids:
+                scores = catalog.similar(product_id)
+                sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+            python = time.perf_counter() - started
+        results.append((size, vectorised, python))
+    return results
@@ -0,0 +1,180 @@
+from sqlalchemy import and_, case, delete, event, func, insert, literal_column, select, union_all
+from sqlalchemy.orm import Session
+from app import db
+from models import Product, Tag, product_tag
+import logging
+
+TAG_FIELDS = ('genre', 'platform')
+
+# (key, label, lower bound inclusive, upper bound exclusive) for price facets
+PRICE_BANDS = [
+    ('under-10', 'Under $10', None, 10),
+    ('10-25', '$10 to $25', 10, 25),
+    ('25-50', '$25 to $50', 25, 50),
+    ('50-100', '$50 to $100', 50, 100),
+    ('100-plus', '$100 and up', 100, None),
+]
+PRICE_BAND_LABELS = {key: label for key, label, _, _ in PRICE_BANDS}
+
+def split_tags(text):
+    """Split "Action, Sci-Fi" into [(key, name)], dropping blanks and case-insensitive repeats"""
+    tags = {}
+    for name in (text or '').split(','):
+        name = name.strip()
+        if name:
+            tags.setdefault(name.lower(), name)
+    return list(tags.items())
+
+def _insert_missing_tags(connection, missing):
+    rows = [{'kind': kind, 'key': key, 'name': name} for (kind, key), name in missing.items()]
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        connection.execute(insert(Tag.__table__), rows)
+        return
+    # Another worker may insert the same tag concurrently
+    connection.execute(dialect_insert(Tag.__table__).on_conflict_do_nothing(index_elements=['kind', 'key']), rows)
+
+def _tag_ids(connection, wanted):
+    """{(kind, key): tag id} for the wanted tags, creating any that are missing"""
+    def existing():
+        ids = {}
+        for kind in {kind for kind, _ in wanted}:
+            keys = [key for tag_kind, key in wanted if tag_kind == kind]
+            rows = connection.execute(select(Tag.id, Tag.key).where(Tag.kind == kind, Tag.key.in_(keys)))
+            ids.update({(kind, key): tag_id for tag_id, key in rows})
+        return ids
+    ids = existing()
+    missing = {tag: name for tag, name in wanted.items() if tag not in ids}
+    if missing:
+        _insert_missing_tags(connection, missing)
+        ids = existing()
+    return ids
+
+def sync_product_tags(connection, rows):
+    """Replace the tag links of the given products from their genre and platform strings.
+
+    `rows` are (product_id, genre, platform). Runs as a few set-based
+    statements on `connection`, inside the caller's transaction.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    wanted = {}
+    links = []
+    for product_id, *values in rows:
+        for kind, text in zip(TAG_FIELDS, values):
+            for key, name in split_tags(text):
+                wanted.setdefault((kind, key), name)
+                links.append((product_id, (kind, key)))
+    ids = _tag_ids(connection, wanted) if wanted else {}
+    connection.execute(delete(product_tag).where(product_tag.c.product_id.in_([row[0] for row in rows])))
+    if links:
+        connection.execute(insert(product_tag), [
+            {'product_id': product_id, 'tag_id': ids[tag]} for product_id, tag in links
+        ])
+
+@event.listens_for(Session, 'after_flush')
+def _sync_flushed_products(session, flush_context):
+    changed = []
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Product) or obj.id is None:
+            continue
+        state = db.inspect(obj)
+        if obj in session.new or any(state.attrs[field].history.has_changes() for field in TAG_FIELDS):
+            changed.append((obj.id, obj.genre, obj.platform))
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, Product)]
+    if not changed and not deleted:
+        return
+    connection = session.connection()
+    sync_product_tags(connection, changed)
+    if deleted:
+        # Databases without enforced foreign keys keep links to deleted rows
+        connection.execute(delete(product_tag).where(product_tag.c.product_id.in_(deleted)))
+
+def backfill_tags(batch_size=1000):
+    """Rebuild tag links for every product from its genre and platform strings.
+
+    Walks the catalog in id order, one transaction per batch, so it can be
+    re-run or interrupted safely. Returns the number of products processed.
+    """
+    last_id = 0
+    total = 0
+    while True:
+        with db.engine.begin() as connection:
+            rows = connection.execute(
+                select(Product.id, Product.genre, Product.platform)
+                .where(Product.id > last_id).order_by(Product.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            sync_product_tags(connection, rows)
+        last_id = rows[-1][0]
+        total += len(rows)
+        logging.info(f"Backfilled tags for {total} products")
+    return total
+
+def tag_filter(kind, keys):
+    """Clause keeping products with any of the given tags of one kind"""
+    return Product.id.in_(
+        select(product_tag.c.product_id)
+        .join(Tag, Tag.id == product_tag.c.tag_id)
+        .where(Tag.kind == kind, Tag.key.in_([key.lower() for key in keys]))
+    )
+
+def price_band_filter(band):
+    """Clause keeping products in a price band; None for an unknown band"""
+    for key, _, low, high in PRICE_BANDS:
+        if key == band:
+            clauses = []
+            if low is not None:
+                clauses.append(Product.price >= low)
+            if high is not None:
+                clauses.append(Product.price < high)
+            return and_(*clauses)
+    return None
+
+def facet_counts(clauses, facet_filters=None):
+    """Genre, platform and price band counts for the products matching `clauses`.
+
+    `facet_filters` maps a facet name to the clause for its selected values.
+    Each facet is counted under every filter except its own, so picking
+    "Action" still shows the other genres with the counts they would add.
+    All three facets come back from one UNION ALL of grouped selects, so the
+    page pays a single round trip. Returns {facet: [{'key', 'name', 'count'}]}.
+    """
+    facet_filters = facet_filters or {}
+
+    def filters_except(facet):
+        return [*clauses, *(clause for name, clause in facet_filters.items() if name != facet)]
+
+    tag_counts = [
+        select(Tag.kind, Tag.key, Tag.name, func.count())
+        .select_from(Product)
+        .join(product_tag, product_tag.c.product_id == Product.id)
+        .join(Tag, Tag.id == product_tag.c.tag_id)
+        .where(Tag.kind == kind, *filters_except(kind))
+        .group_by(Tag.kind, Tag.key, Tag.name)
+        for kind in TAG_FIELDS
+    ]
+    # Group on a subquery column: PostgreSQL will not match a CASE with bound
+    # parameters in GROUP BY against the same CASE in the select list
+    bands = select(case(*[(price_band_filter(key), literal_column(f"'{key}'")) for key, _, _, _ in PRICE_BANDS])
+                   .label('band'))\
+        .where(*filters_except('price'))\
+        .subquery()
+    price_counts = select(literal_column("'price'"), bands.c.band, bands.c.band, func.count())\
+        .group_by(bands.c.band)
+    facets = {'genre': [], 'platform': [], 'price': []}
+    for kind, key, name, count in db.session.execute(union_all(*tag_counts, price_counts)):
+        if kind == 'price':
+            name = PRICE_BAND_LABELS[key]
+        facets[kind].append({'key': key, 'name': name, 'count': count})
+    for kind in TAG_FIELDS:
+        facets[kind].sort(key=lambda facet: (-facet['count'], facet['name']))
+    band_order = [key for key, _, _, _ in PRICE_BANDS]
+    facets['price'].sort(key=lambda facet: band_order.index(facet['key']))
+    return facets
@@ -0,0 +1,17 @@
+import os
+import pytest
+import tempfile
+
+# app.py reads the database URL at import time
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db'))
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+@pytest.fixture
+def app():
+    from main import app, db
+    app.config.update(TESTING=True, RECOMMENDATIONS_AUTO_REFRESH=False)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
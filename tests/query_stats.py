@@ -0,0 +1,41 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from app import db
+
+class QueryCounter:
+    """Records the SQL statements executed while it is active"""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+@contextmanager
+def count_queries(engine=None):
+    """Count the queries run inside the block.
+
+        with count_queries() as counter:
+            client.get('/cart')
+        print(counter.count)
+    """
+    engine = engine or db.engine
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter._record)
+
+@contextmanager
+def assert_max_queries(limit, engine=None):
+    """Fail with the offending SQL if the block runs more than `limit` queries"""
+    with count_queries(engine) as counter:
+        yield counter
+    if counter.count > limit:
+        executed = '\n'.join(counter.statements)
+        raise AssertionError(f"Expected at most {limit} queries, got {counter.count}:\n{executed}")
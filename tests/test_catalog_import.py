@@ -0,0 +1,12 @@
+from catalog_import import import_records
+from models import Product
+import pytest
+
+def record(title, price):
+    return {'title': title, 'description': 'd', 'price': price, 'category': 'game'}
+
+@pytest.mark.parametrize('price', ['nan', 'inf', '-inf'])
+def test_non_finite_price_counts_as_one_invalid_row(app, price):
+    stats = import_records([record('Good', '9.99'), record('Bad', price), record('Also good', '5')])
+    assert stats['errors'] == 1
+    assert sorted(product.title for product in Product.query) == ['Also good', 'Good']
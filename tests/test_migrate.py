@@ -0,0 +1,17 @@
+from app import db
+from migrate import init_db
+from models import CategoryType, Product, ProductNeighbor
+
+def test_init_db_computes_related_products_for_an_existing_catalog(app):
+    db.session.add_all(
+        Product(title=f'Game {n}', description='d', price=10, category=CategoryType.GAME, genre='Action')
+        for n in range(5)
+    )
+    db.session.commit()
+    assert ProductNeighbor.query.count() == 0
+
+    steps = init_db(seed=False)
+    assert steps['neighbors'] == 5
+    assert ProductNeighbor.query.count() > 0
+    # Already computed, so a second deploy leaves them alone
+    assert init_db(seed=False)['neighbors'] == 0
@@ -0,0 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor
+from fake_paypal_server import FakePayPalHandler, serve
+from paypal_client import CircuitBreaker, PayPalClient, PayPalUnavailableError
+import pytest
+import time
+
+@pytest.fixture(scope='module')
+def server():
+    server = serve()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+@pytest.fixture
+def paypal(server):
+    FakePayPalHandler.reset()
+    def make(**options):
+        options.setdefault('backoff', 0)
+        return PayPalClient('client', 'secret', server, **options)
+    return make
+
+def order_calls():
+    return [call for call in FakePayPalHandler.calls if call[0] == '/v2/checkout/orders']
+
+def test_token_is_cached_between_calls(paypal):
+    client = paypal()
+    client.create_order({'intent': 'CAPTURE'})
+    client.create_order({'intent': 'CAPTURE'})
+    assert FakePayPalHandler.token_requests == 1
+
+def test_token_near_expiry_is_refreshed(paypal):
+    FakePayPalHandler.expires_in = 30
+    client = paypal(token_margin=60)
+    client.create_order({})
+    client.create_order({})
+    assert FakePayPalHandler.token_requests == 2
+
+def test_concurrent_refreshes_share_one_token_request(paypal):
+    FakePayPalHandler.token_latency = 0.2
+    client = paypal()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        tokens = set(pool.map(lambda _: client.access_token(), range(8)))
+    assert len(tokens) == 1
+    assert FakePayPalHandler.token_requests == 1
+
+def test_retries_reuse_the_request_id(paypal):
+    FakePayPalHandler.scripted = [503, 503]
+    client = paypal(max_retries=2)
+    response = client.create_order({}, request_id='order-1')
+    assert response.status_code == 201
+    assert order_calls() == [('/v2/checkout/orders', 'order-1')] * 3
+    assert client.metrics()['retries'] == 2
+    # PayPal replays the original order for a repeated id
+    assert client.create_order({}, request_id='order-1').json()['id'] == response.json()['id']
+
+def test_post_without_request_id_is_not_retried(paypal):
+    FakePayPalHandler.scripted = [503]
+    client = paypal(max_retries=2)
+    response = client.request('POST', '/v2/checkout/orders', json={})
+    assert response.status_code == 503
+    assert len(order_calls()) == 1
+
+def test_revoked_token_is_replaced_once(paypal):
+    client = paypal()
+    client.create_order({})
+    FakePayPalHandler.revoke_tokens()
+    assert client.create_order({}).status_code == 201
+    assert FakePayPalHandler.token_requests == 2
+
+def test_breaker_opens_and_recovers(paypal):
+    FakePayPalHandler.scripted = [503, 503]
+    client = paypal(max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.2))
+    client.access_token()
+    assert client.create_order({}).status_code == 503
+    assert client.create_order({}).status_code == 503
+    assert client.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(PayPalUnavailableError):
+        client.create_order({})
+    assert len(order_calls()) == 2
+
+    time.sleep(0.25)
+    assert client.create_order({}).status_code == 201
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+def test_broken_body_on_half_open_trial_reopens_the_breaker(paypal):
+    FakePayPalHandler.scripted = [503, 'truncate']
+    client = paypal(max_retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.1))
+    client.access_token()
+    client.create_order({})
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(0.15)
+    with pytest.raises(PayPalUnavailableError):
+        client.create_order({})
+    assert client.breaker.state == CircuitBreaker.OPEN
+    assert client.metrics()['request_errors'] == 1
+
+    time.sleep(0.15)
+    assert client.create_order({}).status_code == 201
+    assert client.breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,61 @@
+from app import db
+from cart_service import create_order_from_cart, load_cart_items, query_cart_summary
+from models import CartItem, CategoryType, Order, Product
+from query_stats import assert_max_queries
+import pytest
+
+@pytest.fixture
+def cart(app):
+    products = [
+        Product(title=f'Product {n}', description='d', price=5.0 + n, category=CategoryType.GAME)
+        for n in range(6)
+    ]
+    db.session.add_all(products)
+    db.session.flush()
+    db.session.add_all(CartItem(session_id='cart-1', product_id=product.id, quantity=2) for product in products)
+    db.session.commit()
+    db.session.expunge_all()
+    return 'cart-1'
+
+def test_cart_page_loads_items_and_products_in_one_query(cart):
+    with assert_max_queries(1):
+        items = load_cart_items(cart)
+        titles = [item.product.title for item in items]
+    assert len(titles) == 6
+
+def test_cart_summary_is_one_query(cart):
+    with assert_max_queries(1):
+        summary = query_cart_summary(cart)
+    assert summary == {'count': 6, 'items': 12, 'total': 90.0}
+
+def test_order_creation_does_not_grow_with_cart_lines(cart):
+    with assert_max_queries(3):
+        order_id, total = create_order_from_cart(cart, 'ORD-1')
+    assert total == 90.0
+    assert len(db.session.get(Order, order_id).items) == 6
+
+def test_order_total_is_rounded_as_numeric_on_postgresql():
+    # PostgreSQL has no round(double precision, integer)
+    from cart_service import _set_total_from_items
+    from sqlalchemy.dialects import postgresql
+    sql = str(_set_total_from_items(1).compile(dialect=postgresql.dialect()))
+    assert 'round(CAST((SELECT sum(' in sql
+    assert 'AS NUMERIC), ' in sql
+
+@pytest.mark.parametrize('path', ['/cart', '/checkout'])
+def test_cart_pages_do_not_grow_with_cart_lines(app, cart, monkeypatch, path):
+    import routes
+    rendered = {}
+    def render(template, **context):
+        # Touch what the templates show, so lazy loads would be counted
+        rendered['titles'] = [item.product.title for item in context['cart_items']]
+        return ''
+    monkeypatch.setattr(routes, 'render_template', render)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['cart_session_id'] = cart
+    # One summary query and one for the lines with their products
+    with assert_max_queries(2):
+        response = client.get(path)
+    assert response.status_code == 200
+    assert len(rendered['titles']) == 6
@@ -0,0 +1,16 @@
+import recommendations
+import time
+
+def test_completed_orders_are_refreshed_in_one_batch(app, monkeypatch):
+    calls = []
+    monkeypatch.setattr(recommendations, 'refresh_neighbors', lambda ids, expand=False: calls.append(sorted(ids)) or len(ids))
+    app.config['RECOMMENDATIONS_ORDER_DELAY'] = 0.2
+    recommendations.schedule_order_refresh([1, 2])
+    recommendations.schedule_order_refresh([2, 3])
+    recommendations.schedule_order_refresh([4])
+    assert calls == []
+
+    deadline = time.monotonic() + 2
+    while not calls and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert calls == [[1, 2, 3, 4]]
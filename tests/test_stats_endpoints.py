@@ -0,0 +1,19 @@
+import pytest
+
+STATS_PATHS = ['/product-cache/stats', '/page-cache/stats', '/chatbot/engine/stats', '/chatbot/cache/stats', '/paypal/metrics']
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.mark.parametrize('path', STATS_PATHS)
+def test_stats_are_hidden_without_a_configured_token(app, client, path):
+    app.config['STATS_TOKEN'] = None
+    assert client.get(path).status_code == 404
+
+@pytest.mark.parametrize('path', STATS_PATHS)
+def test_stats_need_the_token(app, client, path):
+    app.config['STATS_TOKEN'] = 'secret'
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get(path, headers={'Authorization': 'Bearer secret'}).status_code == 200